@@ -2,13 +2,26 @@ import numpy as np
 import cv2
 import argparse
 import os
+import json
 import time
 import matplotlib.pyplot as plt
 from openvino.runtime import Core
 
+# Model variants are described in backend/intel/model_zoo.json (paths relative to that file)
+MODEL_ZOO_FILE = os.environ.get(
+    "PROSTHETIC_MODEL_ZOO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "intel", "model_zoo.json"),
+)
+
+def model_zoo_path(variant):
+    """Resolve the IR path of a model zoo variant."""
+    with open(MODEL_ZOO_FILE) as f:
+        model_path = json.load(f)["variants"][variant]["model_path"]
+    return os.path.normpath(os.path.join(os.path.dirname(MODEL_ZOO_FILE), model_path))
+
 # Paths to the OpenVINO model files
-SIMPLE_MODEL_XML = "/home/ud1abe88b5fd605dddf2a69d0e88edc8/Training/OpenVINO/hello-world/unet-camvid-onnx-0001.xml"
-OPTIMIZED_MODEL_XML = "/home/ud1abe88b5fd605dddf2a69d0e88edc8/Training/OpenVINO/hello-world/optimized_model.xml"
+SIMPLE_MODEL_XML = model_zoo_path("FP16")
+OPTIMIZED_MODEL_XML = model_zoo_path("INT8")
 
 # Initialize OpenVINO Core
 ie = Core()
@@ -1,6 +1,8 @@
 from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
+from werkzeug.serving import is_running_from_reloader
 import os
+import threading
 
 # Import routes
 try:
@@ -21,6 +23,9 @@ app = Flask(__name__, static_folder=build_path, static_url_path="")
 # Enable CORS for development purposes
 CORS(app)
 
+# Let a fronting nginx/Apache send generated meshes (X-Sendfile) instead of the worker
+app.config["USE_X_SENDFILE"] = os.environ.get("PROSTHETIC_USE_X_SENDFILE", "0") == "1"
+
 # Register blueprints
 if api_blueprint:
     app.register_blueprint(api_blueprint, url_prefix='/api')
@@ -32,6 +37,72 @@ if prosthetic_blueprint:
 else:
     print("Warning: Prosthetic blueprint not loaded.")
 
+# Compile the serving model before the first upload arrives
+SERVING_STATE = {"ready": False, "error": None}
+
+
+def serving_models():
+    """(model_path, device, transforms, config) entries compiled for serving."""
+    from intel2.inference import serving_model_config, serving_model_xml
+    from intel2.inference_server import server_config, server_transforms
+
+    devices = [device.strip() for device in os.environ.get("PROSTHETIC_WARMUP_DEVICES", "CPU").split(",")]
+    return [
+        (serving_model_xml(), device, server_transforms(), server_config(serving_model_config(device)))
+        for device in devices if device
+    ]
+
+
+def warmup_models():
+    """Compile the serving models, start the inference server and run one warmup inference.
+
+    The app reports ready (see /health/ready) only once a blank scan has gone
+    through the inference server end to end.
+    """
+    try:
+        from intel2.compiled_models import registry
+        from intel2.inference_server import get_inference_server
+        from utils.image_preprocessing import allocate_input_buffer
+    except ImportError as e:
+        print(f"Warning: model warmup skipped: {e}")
+        SERVING_STATE["error"] = str(e)
+        return
+    registry.warmup(serving_models())
+    try:
+        get_inference_server().infer(allocate_input_buffer())
+        SERVING_STATE["ready"] = True
+        SERVING_STATE["error"] = None
+        print("Warmup inference complete, ready to serve.")
+    except Exception as e:
+        print(f"Warning: inference server not started: {e}")
+        SERVING_STATE["error"] = str(e)
+
+
+def start_warmup():
+    """Warm up in a background thread so the app starts accepting requests immediately.
+
+    Only entry points call this (the __main__ block below, wsgi.py and
+    gunicorn's post_fork), never an import: spawned meshing workers re-import
+    the main module and must not compile their own copy of the model.
+    """
+    thread = threading.Thread(target=warmup_models, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+@app.route("/health/live")
+def liveness():
+    """The process is up and serving HTTP."""
+    return jsonify({"status": "alive"})
+
+
+@app.route("/health/ready")
+def readiness():
+    """Ready only after the warmup inference has completed in this process."""
+    if SERVING_STATE["ready"]:
+        return jsonify({"status": "ready"})
+    return jsonify({"status": "warming_up", "error": SERVING_STATE["error"]}), 503
+
 # Serve the React app
 @app.route("/")
 def serve_react_app():
@@ -50,6 +121,10 @@ def not_found(e):
     return send_from_directory(app.static_folder, "index.html")
 
 if __name__ == "__main__":
+    # The debug reloader runs this block in a file watcher too; only the
+    # serving child it restarts warms up
+    if is_running_from_reloader():
+        start_warmup()
     print("Starting Flask server...")
     print(f"Serving React app from: {app.static_folder}")
     app.run(debug=True, host="0.0.0.0", port=5000)
@@ -0,0 +1,38 @@
+# File: backend/app/gunicorn.conf.py
+# Usage (from backend/app): gunicorn -c gunicorn.conf.py wsgi:app
+
+import os
+
+# The master imports the app once (preload_app) and workers share those pages
+# copy-on-write. OpenVINO's runtime threads do not survive fork, so the master
+# only fills the OpenVINO model cache, from a spawned process; each worker then
+# compiles from the memory-mapped cached blobs and runs its warmup inference
+# before /health/ready reports ready.
+os.environ.setdefault("PROSTHETIC_OV_CACHE_DIR", os.path.join("cache", "openvino"))
+os.environ["PROSTHETIC_DEFER_WARMUP"] = "1"
+
+bind = os.environ.get("PROSTHETIC_BIND", "0.0.0.0:5000")
+# Each worker runs its own micro-batching inference server and job threads; job
+# records live in PROSTHETIC_JOB_FOLDER (utils/jobs.JobStore) on the shared local
+# disk, so /prosthetic/jobs polls and results can be answered by any worker.
+workers = int(os.environ.get("PROSTHETIC_WORKERS", 2))
+threads = int(os.environ.get("PROSTHETIC_THREADS", 16))
+worker_class = "gthread"
+timeout = int(os.environ.get("PROSTHETIC_WORKER_TIMEOUT", 120))
+graceful_timeout = 30
+preload_app = True
+
+
+def when_ready(server):
+    """Fill the OpenVINO model cache once, before any worker is forked."""
+    from app import serving_models
+    from intel2.compiled_models import precompile
+
+    precompile(serving_models())
+
+
+def post_fork(server, worker):
+    """Warm up in the background so the worker answers /health/* while compiling."""
+    from app import start_warmup
+
+    start_warmup()
@@ -0,0 +1,206 @@
+# File: backend/app/intel2/benchmark.py
+
+import argparse
+import csv
+import json
+import statistics
+import time
+import numpy as np
+from openvino.runtime import Tensor
+from intel2.compiled_models import apply_transform, registry
+from intel2.inference import read_grayscale
+from intel2.model_zoo import model_zoo
+from intel2.postprocessing import CLEANUP_PARAMS, clean_mask, clean_stack, masks_from_output
+from utils.image_preprocessing import Preprocessor, prepare_uint8_input
+
+STAGES = ("preprocess", "infer", "postprocess", "total")
+
+
+def summarize(samples_ns):
+    """Reduce a list of nanosecond timings to latency percentiles and throughput."""
+    samples_ms = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    mean_ms = float(samples_ms.mean())
+    return {
+        "p50_ms": float(np.percentile(samples_ms, 50)),
+        "p90_ms": float(np.percentile(samples_ms, 90)),
+        "p99_ms": float(np.percentile(samples_ms, 99)),
+        "mean_ms": mean_ms,
+        "stdev_ms": statistics.stdev(samples_ms) if len(samples_ms) > 1 else 0.0,
+        "min_ms": float(samples_ms.min()),
+        "max_ms": float(samples_ms.max()),
+        "throughput_fps": 1000.0 / mean_ms if mean_ms > 0 else float("inf"),
+    }
+
+
+def benchmark_model(model_path, image_path, device="CPU", warmup=10, iterations=100, transforms=(), config=None):
+    """Benchmark one model/device pair with warmup and per-stage timings.
+
+    Compile time is measured on a fresh compilation that bypasses the
+    registry cache; the timed iterations then reuse a single infer request
+    so only steady-state latency is recorded. Preprocessing writes straight
+    into the request's input tensor, or passes uint8 through when the
+    "embedded_preprocessing" transform is used.
+    """
+    if iterations < 1:
+        raise ValueError("iterations must be at least 1.")
+
+    core = registry.core
+    start = time.perf_counter_ns()
+    model = core.read_model(model=model_path)
+    for spec in transforms:
+        model = apply_transform(model, spec)
+    compiled_model = core.compile_model(model=model, device_name=device, config=config or {})
+    compile_ns = time.perf_counter_ns() - start
+
+    # The serving path uses the registry, so make sure it holds the same model
+    compiled_model = registry.get(model_path, device, config, transforms)
+    request = compiled_model.create_infer_request()
+    embedded = "embedded_preprocessing" in transforms
+    preprocessor = None if embedded else Preprocessor(shape=tuple(request.get_input_tensor(0).shape))
+
+    timings = {stage: [] for stage in STAGES}
+    mask = None
+    for i in range(warmup + iterations):
+        t0 = time.perf_counter_ns()
+        image = read_grayscale(image_path)
+        if embedded:
+            request.set_input_tensor(Tensor(prepare_uint8_input(image)))
+        else:
+            preprocessor(image, out=request.get_input_tensor(0).data, inplace=True)
+        t1 = time.perf_counter_ns()
+        request.infer()
+        t2 = time.perf_counter_ns()
+        mask = masks_from_output(request.get_output_tensor(0).data)[0]
+        t3 = time.perf_counter_ns()
+        if i < warmup:
+            continue
+        timings["preprocess"].append(t1 - t0)
+        timings["infer"].append(t2 - t1)
+        timings["postprocess"].append(t3 - t2)
+        timings["total"].append(t3 - t0)
+
+    return {
+        "model_path": model_path,
+        "device": device,
+        "warmup": warmup,
+        "iterations": iterations,
+        "compile_ms": compile_ns / 1e6,
+        "stages": {stage: summarize(samples) for stage, samples in timings.items()},
+        "mask": mask,
+    }
+
+
+def _skimage_largest_component(mask):
+    """Reference cleanup: the original skimage label + full bincount implementation."""
+    from skimage import measure
+
+    labels = measure.label(mask, connectivity=2)
+    return (labels == np.argmax(np.bincount(labels.flat)[1:]) + 1).astype(np.uint8)
+
+
+def _time_ns(func, warmup, iterations):
+    """Time `func()` over `iterations` calls after `warmup` untimed calls."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def benchmark_cleanup(mask, stack_depth=32, warmup=5, iterations=50):
+    """Compare skimage and OpenCV connected-component cleanup on a mask and a slice stack."""
+    foreground = np.not_equal(mask, 0).astype(np.uint8)
+    stack = np.repeat(foreground[np.newaxis], stack_depth, axis=0)
+    out = np.empty_like(stack)
+    cases = {
+        "skimage-2d": lambda: _skimage_largest_component(foreground),
+        "opencv-2d": lambda: clean_mask(foreground),
+        "opencv-2d-full": lambda: clean_mask(foreground, **CLEANUP_PARAMS),
+        "skimage-stack": lambda: [_skimage_largest_component(s) for s in stack],
+        "opencv-stack": lambda: clean_stack(stack, out=out),
+    }
+    return {name: summarize(_time_ns(func, warmup, iterations)) for name, func in cases.items()}
+
+
+def write_results(results, json_path=None, csv_path=None):
+    """Write benchmark results keyed by label to JSON and/or CSV files."""
+    serializable = {
+        label: {key: value for key, value in result.items() if key != "mask"}
+        for label, result in results.items()
+    }
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"timestamp": time.time(), "results": serializable}, f, indent=2)
+        print(f"Benchmark results written to: {json_path}")
+    if csv_path:
+        fields = ["label", "model_path", "device", "compile_ms", "stage"] + list(summarize([1]).keys())
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for label, result in serializable.items():
+                for stage, stats in result["stages"].items():
+                    writer.writerow({
+                        "label": label,
+                        "model_path": result["model_path"],
+                        "device": result["device"],
+                        "compile_ms": result["compile_ms"],
+                        "stage": stage,
+                        **stats,
+                    })
+        print(f"Benchmark results written to: {csv_path}")
+
+
+def format_result(label, result):
+    """Format the total-latency summary of one benchmark result."""
+    total = result["stages"]["total"]
+    return (
+        f"{label}: compile {result['compile_ms']:.1f} ms | "
+        f"p50 {total['p50_ms']:.2f} ms, p90 {total['p90_ms']:.2f} ms, p99 {total['p99_ms']:.2f} ms | "
+        f"mean {total['mean_ms']:.2f} ± {total['stdev_ms']:.2f} ms | "
+        f"{total['throughput_fps']:.1f} img/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark segmentation model variants (FP16 and NNCF INT8 by default).")
+    parser.add_argument("--input", type=str, required=True, help="Path to input image file")
+    parser.add_argument("--variants", type=str, default="FP16,INT8",
+                        help="Comma-separated model variants from backend/intel/model_zoo.json")
+    parser.add_argument("--devices", type=str, default="CPU", help="Comma-separated list of devices")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed warmup iterations")
+    parser.add_argument("--iterations", type=int, default=100, help="Timed iterations")
+    parser.add_argument("--embedded_preprocessing", action="store_true",
+                        help="Run resize/normalize/layout conversion inside the model")
+    parser.add_argument("--fused_argmax", action="store_true", help="Fold ArgMax into the model graph")
+    parser.add_argument("--cleanup", action="store_true", help="Also benchmark connected-component cleanup")
+    parser.add_argument("--json", type=str, help="Write results to this JSON file")
+    parser.add_argument("--csv", type=str, help="Write results to this CSV file")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.variants.split(","):
+        variant = model_zoo.variant(name)
+        for device in args.devices.split(","):
+            label = f"{name}-{device}"
+            transforms = variant["transforms"]
+            transforms += ("embedded_preprocessing",) if args.embedded_preprocessing else ()
+            transforms += ("argmax",) if args.fused_argmax else ()
+            results[label] = benchmark_model(
+                variant["model_path"], args.input, device, args.warmup, args.iterations, transforms,
+                model_zoo.compile_config(name, device),
+            )
+            print(format_result(label, results[label]))
+
+    if args.cleanup:
+        mask = next(iter(results.values()))["mask"]
+        for name, stats in benchmark_cleanup(mask).items():
+            print(f"cleanup {name}: p50 {stats['p50_ms']:.2f} ms, mean {stats['mean_ms']:.2f} ± {stats['stdev_ms']:.2f} ms")
+
+    write_results(results, args.json, args.csv)
+
+
+if __name__ == "__main__":
+    main()
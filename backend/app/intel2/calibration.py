@@ -0,0 +1,167 @@
+# File: backend/app/intel2/calibration.py
+
+import os
+import json
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from intel2.inference import read_grayscale
+from utils.file_processing import allowed_file, SLICE_EXTENSIONS
+from utils.image_preprocessing import MODEL_INPUT_SHAPE, THRESHOLD, preprocess_into
+
+# Preprocessed calibration tensors are cached here, one memory-mapped file per image list
+CALIBRATION_CACHE_DIR = os.environ.get("PROSTHETIC_CALIBRATION_CACHE", os.path.join("cache", "calibration"))
+DECODE_WORKERS = int(os.environ.get("PROSTHETIC_CALIBRATION_WORKERS", os.cpu_count() or 4))
+PREFETCH_PER_WORKER = 4  # Decoded images in flight per worker, bounding memory while streaming
+
+# Bump when preprocessing changes so stale caches are rebuilt (the input shape is keyed separately)
+PREPROCESSING_VERSION = f"serving-v1|threshold={THRESHOLD}"
+
+
+def list_images(dataset_dir):
+    """Return every image under `dataset_dir` (recursively), sorted for reproducibility."""
+    paths = []
+    for root, _, names in os.walk(dataset_dir):
+        paths.extend(os.path.join(root, name) for name in names if allowed_file(name, SLICE_EXTENSIONS))
+    return sorted(paths)
+
+
+def stratified_subset(paths, subset_size, dataset_dir):
+    """
+    Picks `subset_size` images spread across the dataset.
+    - Images are stratified by their sub-folder (e.g. one folder per scan or
+      patient); each stratum gets a share proportional to its size, with
+      largest-remainder rounding.
+    - Within a stratum the picks are evenly spaced over the sorted slices, so
+      a series is sampled from end to end rather than from its start.
+    """
+    if subset_size is None or subset_size >= len(paths):
+        return list(paths)
+
+    strata = {}
+    for path in paths:
+        strata.setdefault(os.path.dirname(os.path.relpath(path, dataset_dir)), []).append(path)
+
+    quotas = {name: subset_size * len(members) / len(paths) for name, members in strata.items()}
+    counts = {name: int(quota) for name, quota in quotas.items()}
+    remainder = subset_size - sum(counts.values())
+    for name in sorted(quotas, key=lambda name: counts[name] - quotas[name])[:remainder]:
+        counts[name] += 1
+
+    subset = []
+    for name, members in sorted(strata.items()):
+        if counts[name]:
+            picks = np.linspace(0, len(members) - 1, counts[name]).round().astype(int)
+            subset.extend(members[i] for i in picks)
+    return subset
+
+
+def _cache_key(paths, shape=MODEL_INPUT_SHAPE):
+    """Hash the image list, file sizes and mtimes, the preprocessing version and the input shape."""
+    digest = hashlib.sha256(f"{PREPROCESSING_VERSION}|shape={tuple(shape)}".encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _load_preprocessed(path, out):
+    """Decode and preprocess one image into `out` with the serving pipeline."""
+    preprocess_into(read_grayscale(path), out, inplace=True)
+    return out
+
+
+def iter_preprocessed(paths, workers=DECODE_WORKERS, shape=MODEL_INPUT_SHAPE):
+    """Yield (index, `shape` (1, C, H, W) float32 tensor) pairs, decoding ahead in a thread pool.
+
+    OpenCV releases the GIL while decoding and resizing, so threads decode in
+    parallel; at most PREFETCH_PER_WORKER images per worker are held at once.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calibration") as pool:
+        in_flight = deque()
+        for index, path in enumerate(paths):
+            out = np.empty(shape, dtype=np.float32)
+            in_flight.append((index, pool.submit(_load_preprocessed, path, out)))
+            if len(in_flight) >= workers * PREFETCH_PER_WORKER:
+                index, future = in_flight.popleft()
+                yield index, future.result()
+        while in_flight:
+            index, future = in_flight.popleft()
+            yield index, future.result()
+
+
+class CalibrationDataset:
+    """
+    Calibration images preprocessed exactly as served inputs are.
+    - Images are decoded in a thread pool and written into a float32
+      memory-mapped cache under `cache_dir`, keyed by the image list and the
+      preprocessing version, so repeat runs skip decoding entirely.
+    - `subset_size` selects a stratified subset (see `stratified_subset`).
+    - With `cache_dir=None` tensors are streamed with prefetch instead.
+    - Iterating yields `shape` (1, C, H, W) float32 tensors, as nncf.Dataset
+      expects; a smaller shape matches a reduced-resolution model variant.
+    """
+
+    def __init__(self, dataset_dir, subset_size=None, cache_dir=CALIBRATION_CACHE_DIR, workers=DECODE_WORKERS,
+                 shape=MODEL_INPUT_SHAPE):
+        self.image_paths = stratified_subset(list_images(dataset_dir), subset_size, dataset_dir)
+        if not self.image_paths:
+            raise ValueError(f"No calibration images found in {dataset_dir}.")
+        self.workers = workers
+        self.shape = tuple(shape)
+        self.cache_path = None
+        self._tensors = None
+        if cache_dir:
+            self._tensors = self._load_cache(cache_dir)
+
+    def _load_cache(self, cache_dir):
+        """Map the cached tensors, building the cache first if it is missing or stale."""
+        os.makedirs(cache_dir, exist_ok=True)
+        key = _cache_key(self.image_paths, self.shape)
+        self.cache_path = os.path.join(cache_dir, f"{key}.f32")
+        manifest_path = os.path.join(cache_dir, f"{key}.json")
+        shape = (len(self.image_paths),) + self.shape[1:]
+
+        if not os.path.exists(manifest_path):
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            tensors = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=shape)
+            for index, tensor in iter_preprocessed(self.image_paths, self.workers, self.shape):
+                tensors[index] = tensor[0]
+            tensors.flush()
+            del tensors
+            os.replace(tmp_path, self.cache_path)
+            # The manifest is written last, so its presence marks a complete cache
+            with open(manifest_path, "w") as f:
+                json.dump({"version": PREPROCESSING_VERSION, "shape": list(shape), "images": self.image_paths}, f)
+            print(f"Cached {len(self.image_paths)} calibration tensors in {self.cache_path}")
+        else:
+            print(f"Using cached calibration tensors from {self.cache_path}")
+        return np.memmap(self.cache_path, dtype=np.float32, mode="r", shape=shape)
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, idx):
+        if self._tensors is not None:
+            return np.asarray(self._tensors[idx:idx + 1])
+        return _load_preprocessed(self.image_paths[idx], np.empty(self.shape, dtype=np.float32))
+
+    def __iter__(self):
+        if self._tensors is not None:
+            for idx in range(len(self)):
+                yield self[idx]
+        else:
+            for _, tensor in iter_preprocessed(self.image_paths, self.workers, self.shape):
+                yield tensor
+
+    def get_batch_size(self):
+        return 1  # Required for NNCF calibration
+
+    def get_length(self):
+        """Return the length of the dataset."""
+        return len(self.image_paths)
+
+    def get_inference_data(self):
+        """Yield inference-ready data samples."""
+        return iter(self)
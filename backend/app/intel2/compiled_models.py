@@ -0,0 +1,276 @@
+# File: backend/app/intel2/compiled_models.py
+
+import os
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+
+# Upper bound on the estimated memory held by compiled models in this process
+MAX_CACHE_MB = float(os.environ.get("PROSTHETIC_MODEL_CACHE_MB", 1024))
+
+# OpenVINO model cache: compiled blobs are written here on first compile and
+# memory-mapped on later compiles, so processes compiling the same model load
+# it in milliseconds and share its pages through the OS page cache.
+MODEL_CACHE_DIR = os.environ.get("PROSTHETIC_OV_CACHE_DIR")
+
+# Compiled graphs hold the weights plus device-specific buffers; the .bin size
+# is scaled by this factor to estimate the footprint of a compiled model.
+COMPILED_SIZE_FACTOR = 2.0
+
+# Named graph rewrites applied to a model before it is compiled. Each entry maps
+# a name to a callable taking and returning an openvino Model; the names are part
+# of the cache key, so every variant is compiled and cached separately. A
+# transform is requested as "name" or "name:argument", the argument being
+# passed to the callable as a string.
+MODEL_TRANSFORMS = {}
+
+
+def register_transform(name):
+    """Decorator registering a model transform under `name`."""
+    def decorator(func):
+        MODEL_TRANSFORMS[name] = func
+        return func
+    return decorator
+
+
+@register_transform("dynamic_batch")
+def _dynamic_batch(model):
+    """Make the batch dimension dynamic so micro-batches of any size can run."""
+    model.reshape([-1] + list(model.input().shape)[1:])
+    return model
+
+
+def parse_size(size):
+    """Parse an "HxW" input size whose sides are positive multiples of 16."""
+    try:
+        height, width = (int(value) for value in size.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Invalid input size {size!r}; expected 'HxW'.")
+    if height <= 0 or width <= 0 or height % 16 or width % 16:
+        raise ValueError(f"Invalid input size {size!r}; both sides must be positive multiples of 16.")
+    return height, width
+
+
+@register_transform("reshape")
+def _reshape(model, size):
+    """Set the spatial input size to "HxW"; the UNet needs both to be multiples of 16."""
+    height, width = parse_size(size)
+    model.reshape(list(model.input().shape)[:2] + [height, width])
+    return model
+
+
+def apply_transform(model, spec):
+    """Apply the transform named by `spec` ("name" or "name:argument")."""
+    name, _, argument = spec.partition(":")
+    if argument:
+        return MODEL_TRANSFORMS[name](model, argument)
+    return MODEL_TRANSFORMS[name](model)
+
+
+def _argmax_output(model):
+    """Return the per-pixel argmax of the model's logits as an i32 (N, H, W) output."""
+    import numpy as np
+    from openvino.runtime import opset8 as ops
+
+    logits = model.get_results()[0].input_value(0)
+    topk = ops.topk(logits, 1, 1, "max", "none", index_element_type="i32")
+    return ops.squeeze(topk.output(1), ops.constant(np.array([1], dtype=np.int64)))
+
+
+def _replace_output(model, node):
+    """Rewire the model's result to `node`, keeping the output name and the parameters."""
+    result = model.get_results()[0]
+    result.input(0).replace_source_output(node.output(0))
+    model.validate_nodes_and_infer_types()
+    return model
+
+
+@register_transform("argmax")
+def _fused_argmax(model):
+    """Fold ArgMax into the graph so the model emits a uint8 (N, H, W) class mask."""
+    from openvino.runtime import opset8 as ops
+
+    return _replace_output(model, ops.convert(_argmax_output(model), "u8"))
+
+
+@register_transform("select_class")
+def _select_class(model, class_id):
+    """Fold ArgMax plus a class comparison into the graph, emitting a 0/1 uint8 mask."""
+    import numpy as np
+    from openvino.runtime import opset8 as ops
+
+    selected = ops.equal(_argmax_output(model), ops.constant(np.array(int(class_id), dtype=np.int32)))
+    return _replace_output(model, ops.convert(selected, "u8"))
+
+
+@register_transform("embedded_preprocessing")
+def _embedded_preprocessing(model):
+    """Fold resize, [0, 1] normalization and NHWC->NCHW conversion into the model.
+
+    The compiled model accepts a uint8 NHWC tensor of any spatial size, so the
+    host only thresholds and expands gray to RGB (see
+    utils.image_preprocessing.prepare_uint8_input). Apply after dynamic_batch.
+    """
+    from openvino.preprocess import PrePostProcessor, ResizeAlgorithm
+    from openvino.runtime import Layout, Type
+
+    ppp = PrePostProcessor(model)
+    ppp.input().tensor().set_element_type(Type.u8).set_layout(Layout("NHWC")).set_spatial_dynamic_shape()
+    ppp.input().preprocess().convert_element_type(Type.f32).resize(ResizeAlgorithm.RESIZE_LINEAR).scale(255.0)
+    ppp.input().model().set_layout(Layout("NCHW"))
+    return ppp.build()
+
+
+class CompiledModelRegistry:
+    """Process-wide LRU registry of compiled OpenVINO models.
+
+    Models are keyed by (model path, device, config, transforms), compiled lazily on
+    first use and evicted least-recently-used first once the estimated
+    memory of all cached models exceeds `max_cache_mb`.
+    """
+
+    def __init__(self, max_cache_mb=MAX_CACHE_MB):
+        self.max_cache_bytes = int(max_cache_mb * 1024 * 1024)
+        self._core = None
+        self._entries = OrderedDict()  # key -> (compiled_model, size_bytes)
+        self._compile_locks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def core(self):
+        """Shared OpenVINO Core, created (and openvino imported) on first access."""
+        with self._lock:
+            if self._core is None:
+                from openvino.runtime import Core
+
+                self._core = Core()
+                if MODEL_CACHE_DIR:
+                    self._core.set_property({"CACHE_DIR": MODEL_CACHE_DIR})
+            return self._core
+
+    @staticmethod
+    def make_key(model_path, device="CPU", config=None, transforms=()):
+        """Build the cache key for a model/device/config/transforms combination."""
+        config_items = tuple(sorted((str(k), str(v)) for k, v in (config or {}).items()))
+        return os.path.abspath(model_path), device, config_items, tuple(transforms)
+
+    def get(self, model_path, device="CPU", config=None, transforms=()):
+        """Return the compiled model, compiling it on first use."""
+        unknown = [spec for spec in transforms if spec.partition(":")[0] not in MODEL_TRANSFORMS]
+        if unknown:
+            raise ValueError(f"Unknown model transforms: {', '.join(unknown)}")
+        key = self.make_key(model_path, device, config, transforms)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            compile_lock = self._compile_locks.setdefault(key, threading.Lock())
+
+        # Compile outside the registry lock so other models stay available,
+        # but only once per key when several requests miss at the same time.
+        with compile_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+
+            model = self.core.read_model(model=model_path)
+            for spec in transforms:
+                model = apply_transform(model, spec)
+            compiled_model = self.core.compile_model(model=model, device_name=device, config=config or {})
+            size_bytes = _estimate_compiled_size(model_path)
+
+            with self._lock:
+                self._entries[key] = (compiled_model, size_bytes)
+                self._compile_locks.pop(key, None)
+                self._evict()
+            return compiled_model
+
+    def _evict(self):
+        """Drop least-recently-used models until under the memory cap (keeps the newest)."""
+        total = sum(size for _, size in self._entries.values())
+        while total > self.max_cache_bytes and len(self._entries) > 1:
+            key, (_, size) = self._entries.popitem(last=False)
+            total -= size
+            print(f"Evicted compiled model {key[0]} on {key[1]} ({size / (1024 * 1024):.1f} MB)")
+
+    def warmup(self, models):
+        """Compile each (model_path, device[, transforms[, config]]) entry ahead of the first request."""
+        for model_path, device, *options in models:
+            transforms = tuple(options[0]) if options else ()
+            config = options[1] if len(options) > 1 else None
+            try:
+                self.get(model_path, device, config, transforms)
+                print(f"Warmed up {model_path} on {device}")
+            except Exception as e:
+                print(f"Warning: warmup failed for {model_path} on {device}: {e}")
+
+    def clear(self):
+        """Release all compiled models."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return a summary of the cached models."""
+        with self._lock:
+            return {
+                "models": [
+                    {
+                        "model_path": key[0],
+                        "device": key[1],
+                        "transforms": list(key[3]),
+                        "size_mb": size / (1024 * 1024),
+                    }
+                    for key, (_, size) in self._entries.items()
+                ],
+                "total_mb": sum(size for _, size in self._entries.values()) / (1024 * 1024),
+                "max_mb": self.max_cache_bytes / (1024 * 1024),
+            }
+
+
+def model_fingerprint(model_path):
+    """Short hash of the IR's .xml and .bin sizes and mtimes, which change whenever the model is rewritten."""
+    digest = hashlib.sha256()
+    for path in (model_path, os.path.splitext(model_path)[0] + ".bin"):
+        try:
+            stat = os.stat(path)
+            digest.update(f"{os.path.basename(path)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+        except OSError:
+            digest.update(f"{os.path.basename(path)}|missing\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def _estimate_compiled_size(model_path):
+    """Estimate the memory footprint of a compiled model from its weights file."""
+    bin_path = os.path.splitext(model_path)[0] + ".bin"
+    weights = os.path.getsize(bin_path) if os.path.exists(bin_path) else 0
+    return int(weights * COMPILED_SIZE_FACTOR)
+
+
+# Shared by the Flask routes and the benchmarking entry point
+registry = CompiledModelRegistry()
+
+
+def _precompile_worker(models):
+    registry.warmup(models)
+
+
+def precompile(models):
+    """Populate MODEL_CACHE_DIR for `models` from a spawned process.
+
+    Used by pre-forking servers: the parent fills the cache without starting
+    OpenVINO's runtime threads, which do not survive fork, and each forked
+    worker then compiles from the cached blobs.
+    """
+    if not MODEL_CACHE_DIR:
+        print("Warning: PROSTHETIC_OV_CACHE_DIR is not set, skipping precompilation.")
+        return
+    process = multiprocessing.get_context("spawn").Process(target=_precompile_worker, args=(list(models),))
+    process.start()
+    process.join()
+
+
+def get_compiled_model(model_path, device="CPU", config=None, transforms=()):
+    """Return a compiled model from the process-wide registry."""
+    return registry.get(model_path, device, config, transforms)
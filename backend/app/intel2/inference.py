@@ -4,29 +4,57 @@ import numpy as np
 import cv2
 import argparse
 import os
+import json
 import time
-import matplotlib.pyplot as plt
-from openvino.runtime import Core
-
-# Paths to the OpenVINO model files
-SIMPLE_MODEL_XML = "C:/Users/soumy/OneDrive/Desktop/AI_Enabled_Prosthetic_Design/backend/intel/unet-camvid-onnx-0001/FP16/unet-camvid-onnx-0001.xml"
-OPTIMIZED_MODEL_XML = "C:/Users/soumy/OneDrive/Desktop/AI_Enabled_Prosthetic_Design/backend/intel/unet-camvid-onnx-0001/FP16/optimized_nncf/optimized_model.xml"
-
-# Initialize OpenVINO Core
-ie = Core()
+from intel2.compiled_models import get_compiled_model
+from intel2.model_zoo import model_zoo
+from intel2.postprocessing import masks_from_output
+from utils.image_preprocessing import MODEL_INPUT_SHAPE, allocate_input_buffer, preprocess_into, prepare_uint8_input
+
+# Paths to the OpenVINO model files (see backend/intel/model_zoo.json)
+SIMPLE_MODEL_XML = model_zoo.model_path("FP16")
+OPTIMIZED_MODEL_XML = model_zoo.model_path("INT8")
+
+# Model chosen for serving by the quantization workflow (see intel2/optimization.py)
+SERVING_MODEL_FILE = os.environ.get("PROSTHETIC_SERVING_MODEL", os.path.join("models", "serving_model.json"))
+
+def _serving_record():
+    if not os.path.exists(SERVING_MODEL_FILE):
+        return None
+    with open(SERVING_MODEL_FILE) as f:
+        return json.load(f)
+
+def serving_model_xml():
+    """Return the registered serving model, or SIMPLE_MODEL_XML if none is registered."""
+    record = _serving_record()
+    return record["model_path"] if record else SIMPLE_MODEL_XML
+
+def serving_model_config(device="CPU"):
+    """Return the compile config the registered serving model was selected with on `device`, or None.
+
+    Configs are device-specific (e.g. CPU sparse weight decompression), so a
+    model measured on another device compiles with the defaults.
+    """
+    record = _serving_record()
+    if not record or record.get("device", "CPU") != device:
+        return None
+    return record.get("config") or None
 
 def preprocess_image(file_path):
     """Preprocess image for inference."""
+    # The decoded image is private to this call, so threshold it in place
+    return preprocess_array(read_grayscale(file_path), inplace=True)
+
+def preprocess_array(image, inplace=False, shape=MODEL_INPUT_SHAPE):
+    """Preprocess an already decoded grayscale image for inference at the (1, C, H, W) `shape`."""
+    return preprocess_into(image, allocate_input_buffer(shape=shape), inplace=inplace)
+
+def read_grayscale(file_path):
+    """Read an image file as a single-channel uint8 array."""
     image = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
     if image is None:
         raise ValueError(f"Error: Unable to read the image file at {file_path}.")
-    _, thresholded_image = cv2.threshold(image, 10, 255, cv2.THRESH_BINARY)
-    resized_image = cv2.resize(thresholded_image, (480, 368))
-    rgb_image = cv2.cvtColor(resized_image, cv2.COLOR_GRAY2RGB)
-    normalized_image = rgb_image / 255.0
-    transposed_image = normalized_image.transpose(2, 0, 1)
-    input_tensor = np.expand_dims(transposed_image, axis=0)
-    return input_tensor.astype(np.float32)
+    return image
 
 def calculate_accuracy(predicted_mask, ground_truth_path):
     """Calculate pixel-wise accuracy."""
@@ -38,20 +66,44 @@ def calculate_accuracy(predicted_mask, ground_truth_path):
     total = ground_truth.size
     return correct / total
 
-def run_inference(file_path, model_path, device="CPU", ground_truth_path=None):
-    """Run segmentation inference and measure performance."""
-    model = ie.read_model(model=model_path)
-    compiled_model = ie.compile_model(model=model, device_name=device)
+def segment_image(file_path, model_path=SIMPLE_MODEL_XML, device="CPU", embedded_preprocessing=False):
+    """Run segmentation on an image file and return the uint8 class mask.
+
+    With `embedded_preprocessing` the uint8 image is passed to a model variant
+    that resizes and normalizes it on the device.
+    """
+    if embedded_preprocessing:
+        compiled_model = get_compiled_model(model_path, device, transforms=("embedded_preprocessing",))
+        input_tensor = prepare_uint8_input(read_grayscale(file_path))
+    else:
+        compiled_model = get_compiled_model(model_path, device)
+        input_tensor = preprocess_image(file_path)
+    results = compiled_model([input_tensor])
+    return masks_from_output(next(iter(results.values())))[0]
+
+def run_inference(file_path, model_path, device="CPU", ground_truth_path=None, fused_argmax=True):
+    """Run segmentation inference and measure performance.
+
+    With `fused_argmax` the model emits the uint8 mask directly; if that graph
+    rewrite fails to compile, the logits are reduced by the NumPy fallback.
+    """
+    compiled_model = None
+    if fused_argmax:
+        try:
+            compiled_model = get_compiled_model(model_path, device, transforms=("argmax",))
+        except Exception as e:
+            print(f"Warning: fused ArgMax unavailable, using NumPy post-processing: {e}")
+    if compiled_model is None:
+        compiled_model = get_compiled_model(model_path, device)
     input_tensor = preprocess_image(file_path)
 
     # Measure inference time
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
     results = compiled_model([input_tensor])  # Returns a dictionary of outputs
-    inference_time = time.time() - start_time
+    inference_time = (time.perf_counter_ns() - start_time) / 1e9
 
-    # Process segmentation mask
-    result = next(iter(results.values()))  # Access the first output
-    segmentation_mask = np.argmax(result, axis=1).squeeze().astype(np.uint8)
+    # Process segmentation mask (copied out of the fused uint8 output, or reduced without an int64 map)
+    segmentation_mask = masks_from_output(next(iter(results.values())))[0]
 
     # Calculate accuracy if ground truth is provided
     accuracy = None
@@ -62,6 +114,9 @@ def run_inference(file_path, model_path, device="CPU", ground_truth_path=None):
 
 def plot_comparative_metrics(metrics):
     """Plot comparative inference time and accuracy as a bar graph with a separation line."""
+    # Only the command-line comparison plots, so the server never imports matplotlib
+    import matplotlib.pyplot as plt
+
     labels = [
         "Simple model-CPU",
         "Optimized model-CPU",
@@ -82,7 +137,7 @@ def plot_comparative_metrics(metrics):
         ax.text(
             bar.get_x() + bar.get_width() / 2,
             height + 0.02,
-            f"{times[i]:.2f}s",
+            f"{times[i]:.4f}s",
             ha="center",
             fontsize=10,
             color="black",
@@ -103,7 +158,7 @@ def plot_comparative_metrics(metrics):
     # Add labels and title
     ax.set_xticks(x)
     ax.set_xticklabels(labels, rotation=15)
-    ax.set_ylabel("Inference Time (s)")
+    ax.set_ylabel("Median Inference Time (s)")
     ax.set_title(
         "Inference Time and Accuracy Comparison:\n"
         "Simple UNet Model vs NNCF Optimized UNet Segmentation Model"
@@ -118,18 +173,30 @@ def main():
     parser = argparse.ArgumentParser(description="Run inference comparison for simple and optimized models on CPU and GPU.")
     parser.add_argument("--input", type=str, required=True, help="Path to input image file")
     parser.add_argument("--ground_truth", type=str, required=True, help="Path to ground truth image file")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed warmup iterations per configuration")
+    parser.add_argument("--iterations", type=int, default=100, help="Timed iterations per configuration")
+    parser.add_argument("--json", type=str, help="Write benchmark results to this JSON file")
+    parser.add_argument("--csv", type=str, help="Write benchmark results to this CSV file")
     args = parser.parse_args()
 
+    from intel2.benchmark import benchmark_model, format_result, write_results
+
     metrics = {}
+    results = {}
 
     # Run inference for both models on CPU and GPU
     print("Running inference for all configurations...")
     for model_name, model_path in [("Simple model", SIMPLE_MODEL_XML), ("Optimized model", OPTIMIZED_MODEL_XML)]:
         for device in ["CPU", "GPU"]:
             label = f"{model_name}-{device}"  # Match labels used in the graph
-            time_, accuracy = run_inference(args.input, model_path, device=device, ground_truth_path=args.ground_truth)
-            metrics[label] = {"time": time_, "accuracy": accuracy}
-            print(f"{label}: Time: {time_:.4f}s, Accuracy: {accuracy * 100:.2f}%" if accuracy is not None else f"{label}: Time: {time_:.4f}s")
+            result = benchmark_model(model_path, args.input, device, args.warmup, args.iterations)
+            accuracy = calculate_accuracy(result["mask"], args.ground_truth)
+            results[label] = result
+            # The graph reports the median steady-state latency in seconds
+            metrics[label] = {"time": result["stages"]["total"]["p50_ms"] / 1000.0, "accuracy": accuracy}
+            print(f"{format_result(label, result)} | Accuracy: {accuracy * 100:.2f}%")
+
+    write_results(results, args.json, args.csv)
 
     # Plot the metrics
     plot_comparative_metrics(metrics)
@@ -0,0 +1,215 @@
+# File: backend/app/intel2/inference_server.py
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from intel2.compiled_models import get_compiled_model, model_fingerprint, parse_size
+from intel2.inference import serving_model_config, serving_model_xml
+from intel2.model_zoo import model_zoo
+from intel2.postprocessing import masks_from_output
+from utils.image_preprocessing import MODEL_INPUT_SHAPE
+
+# Micro-batching defaults, overridable through the environment
+MAX_BATCH_SIZE = int(os.environ.get("PROSTHETIC_MAX_BATCH_SIZE", 4))
+MAX_WAIT_MS = float(os.environ.get("PROSTHETIC_MAX_WAIT_MS", 5))
+# The CPU plugin defaults to LATENCY, whose optimal number of infer requests is 1;
+# THROUGHPUT sizes the request pool (and CPU streams) for concurrent batches
+PERFORMANCE_HINT = os.environ.get("PROSTHETIC_PERFORMANCE_HINT", "THROUGHPUT")
+
+# Input size ("HxW", multiples of 16) of the reshaped serving model used for quick previews
+PREVIEW_SIZE = os.environ.get("PROSTHETIC_PREVIEW_SIZE", "192x240")
+
+_SHUTDOWN = object()
+
+
+def server_config(config=None):
+    """Compile config of an InferenceServer: the performance hint, overridden by `config` (e.g. a zoo variant's)."""
+    return {"PERFORMANCE_HINT": PERFORMANCE_HINT, **(config or {})}
+
+
+def server_transforms(max_batch_size=MAX_BATCH_SIZE, fused_argmax=True, class_id=None):
+    """Model transforms an InferenceServer compiles with (dynamic batch, then the fused output)."""
+    transforms = ("dynamic_batch",) if max_batch_size > 1 else ()
+    if fused_argmax:
+        transforms += ("argmax" if class_id is None else f"select_class:{class_id}",)
+    return transforms
+
+
+class InferenceServer:
+    """Pool of asynchronous infer requests fed by a micro-batching dispatcher.
+
+    `submit` enqueues a single (1, C, H, W) input tensor and returns a Future
+    resolving to its uint8 segmentation mask. A dispatcher thread merges
+    concurrent submissions into batches of up to `max_batch_size`, waiting
+    at most `max_wait_ms` for a batch to fill, and starts them on an
+    AsyncInferQueue sized from the device's optimal number of requests.
+
+    With `fused_argmax` the model emits uint8 masks directly (restricted to
+    `class_id` when given); if that graph rewrite fails to compile, logits
+    are reduced on the host by the preallocated NumPy fallback instead.
+    `model_path` defaults to the registered serving model, compiled with the
+    config it was selected with unless `config` is given; `model_transforms`
+    (e.g. a reshape to a smaller `input_shape`) are applied before the
+    server's own transforms, and `config` is passed to compilation on top
+    of the PERFORMANCE_HINT (see `server_config`). `num_requests` defaults
+    to the compiled model's optimal number of infer requests.
+    """
+
+    def __init__(self, model_path=None, device="CPU", max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_WAIT_MS, num_requests=None, fused_argmax=True, class_id=None,
+                 model_transforms=(), input_shape=MODEL_INPUT_SHAPE, config=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        if model_path is None:
+            model_path = serving_model_xml()
+            config = serving_model_config(device) if config is None else config
+        model_transforms = tuple(model_transforms)
+        config = server_config(config)
+        self.model_path = model_path
+        self.model_transforms = model_transforms
+        self.config = config
+        # Identifies the served model in cache keys; the fingerprint is taken as the
+        # model is loaded, so re-quantizing an IR in place never reuses old results
+        model_name = f"{os.path.basename(model_path)}@{model_fingerprint(model_path)}"
+        self.model_id = "|".join((model_name,) + model_transforms)
+        self.input_shape = tuple(input_shape)
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.class_id = class_id
+
+        self.compiled_model = None
+        if fused_argmax:
+            try:
+                self.compiled_model = get_compiled_model(
+                    model_path, device, config,
+                    transforms=model_transforms + server_transforms(max_batch_size, True, class_id),
+                )
+            except Exception as e:
+                print(f"Warning: fused ArgMax unavailable, using NumPy post-processing: {e}")
+        if self.compiled_model is None:
+            self.compiled_model = get_compiled_model(
+                model_path, device, config, transforms=model_transforms + server_transforms(max_batch_size, False)
+            )
+        if num_requests is None:
+            num_requests = self.compiled_model.get_property("OPTIMAL_NUMBER_OF_INFER_REQUESTS")
+        self.num_requests = max(1, int(num_requests))
+        print(f"Inference server for {os.path.basename(model_path)} on {device}: {self.num_requests} infer requests "
+              f"({config['PERFORMANCE_HINT']} hint), batches of up to {max_batch_size}")
+
+        from openvino.runtime import AsyncInferQueue
+
+        self._infer_queue = AsyncInferQueue(self.compiled_model, self.num_requests)
+        self._infer_queue.set_callback(self._on_complete)
+        self._pending = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="inference-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, input_tensor):
+        """Queue one preprocessed input and return a Future for its mask."""
+        future = Future()
+        self._pending.put((input_tensor, future))
+        return future
+
+    def infer(self, input_tensor, timeout=None):
+        """Submit an input and block until its mask is ready."""
+        return self.submit(input_tensor).result(timeout=timeout)
+
+    def _collect_batch(self, first):
+        """Gather queued requests after `first` until the batch is full or the wait expires."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _SHUTDOWN:
+                self._pending.put(_SHUTDOWN)
+                break
+            batch.append(item)
+        return batch
+
+    def _dispatch_loop(self):
+        """Merge pending submissions into micro-batches and start them asynchronously."""
+        while True:
+            item = self._pending.get()
+            if item is _SHUTDOWN:
+                break
+            # Drop requests whose callers cancelled while they were queued
+            batch = [(tensor, future) for tensor, future in self._collect_batch(item)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            inputs = [tensor for tensor, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                batch_tensor = inputs[0] if len(inputs) == 1 else np.concatenate(inputs, axis=0)
+                # Blocks while every infer request is busy, which throttles the dispatcher
+                self._infer_queue.start_async({0: batch_tensor}, futures)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+
+    def _on_complete(self, request, futures):
+        """Split a finished batch into per-request masks and resolve the futures."""
+        try:
+            # Copies out of the request's output buffer before it is reused
+            masks = masks_from_output(request.get_output_tensor(0).data, self.class_id)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for index, future in enumerate(futures):
+            future.set_result(masks[index])
+
+    def shutdown(self):
+        """Stop accepting work and wait for in-flight requests to finish."""
+        self._pending.put(_SHUTDOWN)
+        self._dispatcher.join()
+        self._infer_queue.wait_all()
+
+
+_servers = {}
+_server_lock = threading.Lock()
+
+
+def _get_server(key, factory):
+    """Return the process-wide server under `key`, creating it with `factory()` on first use."""
+    with _server_lock:
+        if key not in _servers:
+            _servers[key] = factory()
+        return _servers[key]
+
+
+def _variant_server(variant):
+    spec = model_zoo.variant(variant)
+    return InferenceServer(
+        spec["model_path"], model_transforms=spec["transforms"], input_shape=spec["input_shape"],
+        config=model_zoo.compile_config(variant),
+    )
+
+
+def get_inference_server(variant=None):
+    """Return the process-wide inference server for a model zoo variant, starting it on first use.
+
+    `variant=None` is the default serving model.
+    """
+    if variant is None:
+        return _get_server(None, InferenceServer)
+    return _get_server(variant, lambda: _variant_server(variant))
+
+
+def get_preview_server(size=PREVIEW_SIZE):
+    """Return the server running the default serving model reshaped to `size` for quick, low-cost masks."""
+    height, width = parse_size(size)
+    return _get_server(
+        ("preview", size),
+        lambda: InferenceServer(model_transforms=(f"reshape:{size}",), input_shape=(1, 3, height, width)),
+    )
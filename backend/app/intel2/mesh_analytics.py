@@ -0,0 +1,83 @@
+# File: backend/app/intel2/mesh_analytics.py
+
+import os
+import numpy as np
+
+# The oriented bounding box needs a convex hull and an optimization over it,
+# so it is only computed when enabled here or requested explicitly.
+COMPUTE_ORIENTED_BOUNDS = os.environ.get("PROSTHETIC_MESH_OBB", "0") == "1"
+
+
+def mesh_metrics(mesh, oriented_bounds=COMPUTE_ORIENTED_BOUNDS):
+    """
+    Computes the geometric summary of a Mesh with vectorized NumPy.
+    - The face corners are gathered once; area, enclosed volume and centroid
+      all come from the same per-face cross products.
+    - Volume and centroid use signed tetrahedra against the origin, so they
+      are exact for closed meshes; the centroid falls back to the area-weighted
+      surface centroid when the enclosed volume is zero.
+    - Principal axes are the eigenvectors of the area-weighted surface
+      covariance, largest extent first.
+    - The oriented bounding box (via trimesh) is added with `oriented_bounds=True`.
+    Returns a JSON-serializable dict in the mesh's units.
+    """
+    triangles = mesh.triangles.astype(np.float64)
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    cross = np.cross(v1 - v0, v2 - v0)
+    areas = 0.5 * np.linalg.norm(cross, axis=1)
+    area = float(areas.sum())
+
+    # Signed volume of the tetrahedron (origin, v0, v1, v2) of every face
+    tetra_volumes = np.einsum("ij,ij->i", v0, cross) / 6.0
+    volume = float(tetra_volumes.sum())
+    face_centroids = triangles.mean(axis=1)
+    if volume != 0.0:
+        # Tetrahedron centroid is (v0 + v1 + v2) / 4 (the origin adds nothing)
+        centroid = (tetra_volumes @ face_centroids) * 0.75 / volume
+    elif area > 0.0:
+        centroid = (areas @ face_centroids) / area
+    else:
+        centroid = mesh.vertices.mean(axis=0) if len(mesh.vertices) else np.zeros(3)
+
+    lower, upper = mesh.vertices.min(axis=0), mesh.vertices.max(axis=0)
+    extents = upper - lower
+
+    if area > 0.0:
+        offsets = face_centroids - centroid
+        covariance = (offsets * areas[:, np.newaxis]).T @ offsets / area
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1]
+        axes, moments = eigenvectors[:, order].T, eigenvalues[order]
+    else:
+        axes, moments = np.eye(3), np.zeros(3)
+
+    metrics = {
+        "volume": abs(volume),
+        "surface_area": area,
+        "centroid": centroid.tolist(),
+        "aabb": {
+            "min": lower.tolist(),
+            "max": upper.tolist(),
+            "extents": extents.tolist(),
+            "volume": float(np.prod(extents.astype(np.float64))),
+        },
+        "principal_axes": axes.tolist(),
+        "principal_moments": moments.tolist(),
+        "triangles": len(mesh.faces),
+        "vertices": len(mesh.vertices),
+    }
+    if oriented_bounds:
+        metrics["obb"] = oriented_bounding_box(mesh)
+    return metrics
+
+
+def oriented_bounding_box(mesh):
+    """Minimum-volume oriented bounding box (extents, transform, volume) via trimesh."""
+    import trimesh
+
+    obb = trimesh.Trimesh(mesh.vertices, mesh.faces, process=False).bounding_box_oriented
+    return {
+        "extents": obb.primitive.extents.tolist(),
+        "transform": obb.primitive.transform.tolist(),
+        "volume": float(obb.volume),
+    }
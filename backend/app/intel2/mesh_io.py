@@ -0,0 +1,289 @@
+# File: backend/app/intel2/mesh_io.py
+
+import gzip
+import json
+import struct
+import numpy as np
+
+# Binary STL: 80-byte header, uint32 triangle count, then 50 bytes per triangle
+STL_HEADER = b"prosthetic mesh".ljust(80, b" ")
+STL_TRIANGLE_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attributes", "<u2"),
+])
+STL_WRITE_CHUNK = 1 << 18  # Triangles formatted per write, bounding the temporary buffers
+
+# glTF 2.0 binary container (https://registry.khronos.org/glTF/specs/2.0/glTF-2.0.html#glb-file-format-specification)
+GLB_MAGIC = 0x46546C67
+GLB_JSON_CHUNK = 0x4E4F534A
+GLB_BIN_CHUNK = 0x004E4942
+GL_BYTE, GL_FLOAT, GL_UNSIGNED_SHORT, GL_UNSIGNED_INT = 5120, 5126, 5123, 5125
+GL_ARRAY_BUFFER, GL_ELEMENT_ARRAY_BUFFER = 34962, 34963
+DRACO_QUANTIZATION_BITS = 14
+DRACO_COMPRESSION_LEVEL = 7
+
+# Precompressed copies served when the client accepts the encoding
+SIDECAR_ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+class Mesh:
+    """
+    Indexed triangle mesh backed by contiguous NumPy arrays.
+    - `vertices` is float32 (V, 3) and `faces` int32 (F, 3); inputs are only
+      copied when their dtype or layout differs.
+    - This is the representation passed between meshing stages; Open3D
+      objects are created only for the stages that need them.
+    """
+
+    def __init__(self, vertices, faces):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.faces)
+
+    @property
+    def triangles(self):
+        """(F, 3, 3) corner coordinates of every face (a gathered copy)."""
+        return self.vertices[self.faces]
+
+    def face_normals(self, triangles=None):
+        """Unit normals of every face; degenerate faces get a zero normal."""
+        triangles = self.triangles if triangles is None else triangles
+        normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        np.divide(normals, lengths, out=normals, where=lengths > 0)
+        return normals
+
+    def vertex_normals(self):
+        """Unit vertex normals, area-weighted averages of the adjacent face normals."""
+        triangles = self.triangles
+        weighted = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        normals = np.zeros((len(self.vertices), 3), dtype=np.float32)
+        for corner in range(3):
+            for axis in range(3):
+                normals[:, axis] += np.bincount(self.faces[:, corner], weights=weighted[:, axis],
+                                                minlength=len(self.vertices))
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        np.divide(normals, lengths, out=normals, where=lengths > 0)
+        return normals
+
+    def edges(self):
+        """Unique undirected edges as an (E, 2) int array with edge[:, 0] < edge[:, 1].
+
+        Degenerate faces repeating a vertex add no (v, v) self-edge.
+        """
+        edges = np.sort(self.faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1).astype(np.int64)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        keys = np.unique(edges[:, 0] * len(self.vertices) + edges[:, 1])
+        return np.stack(np.divmod(keys, len(self.vertices)), axis=1)
+
+    def smooth_simple(self, iterations=1):
+        """
+        Averages each vertex with its neighbours `iterations` times, like
+        Open3D's filter_smooth_simple, without leaving NumPy.
+        - Returns a new Mesh sharing the faces array.
+        """
+        edges = self.edges()
+        a, b = edges[:, 0], edges[:, 1]
+        count = len(self.vertices)
+        degree = np.bincount(a, minlength=count) + np.bincount(b, minlength=count) + 1.0
+        vertices = self.vertices.astype(np.float64)
+        for _ in range(iterations):
+            sums = vertices.copy()
+            for axis in range(3):
+                sums[:, axis] += np.bincount(a, weights=vertices[b, axis], minlength=count)
+                sums[:, axis] += np.bincount(b, weights=vertices[a, axis], minlength=count)
+            vertices = sums / degree[:, np.newaxis]
+        return Mesh(vertices, self.faces)
+
+    def to_open3d(self):
+        """Build an Open3D TriangleMesh (Open3D stores float64 vertices, so this copies)."""
+        import open3d as o3d
+
+        o3d_mesh = o3d.geometry.TriangleMesh()
+        o3d_mesh.vertices = o3d.utility.Vector3dVector(self.vertices.astype(np.float64))
+        o3d_mesh.triangles = o3d.utility.Vector3iVector(self.faces)
+        return o3d_mesh
+
+    @classmethod
+    def from_open3d(cls, o3d_mesh):
+        """Copy an Open3D TriangleMesh into a Mesh."""
+        return cls(np.asarray(o3d_mesh.vertices), np.asarray(o3d_mesh.triangles))
+
+
+def write_stl(mesh, file, binary=True):
+    """Write a Mesh as binary or ASCII STL to a path or binary file object."""
+    if isinstance(file, str):
+        with open(file, "wb") as f:
+            return write_stl(mesh, f, binary)
+
+    if binary:
+        file.write(STL_HEADER)
+        file.write(np.uint32(len(mesh)).tobytes())
+    else:
+        file.write(b"solid prosthetic\n")
+
+    # Format in chunks so multi-million-triangle meshes never need a full-size copy
+    for start in range(0, len(mesh), STL_WRITE_CHUNK):
+        triangles = mesh.vertices[mesh.faces[start:start + STL_WRITE_CHUNK]]
+        normals = mesh.face_normals(triangles)
+        if binary:
+            records = np.zeros(len(triangles), dtype=STL_TRIANGLE_DTYPE)
+            records["normal"] = normals
+            records["vertices"] = triangles
+            file.write(records.tobytes())
+        else:
+            values = np.concatenate((normals, triangles.reshape(-1, 9)), axis=1)
+            file.write(("".join(
+                "facet normal %e %e %e\n outer loop\n  vertex %e %e %e\n  vertex %e %e %e\n"
+                "  vertex %e %e %e\n endloop\nendfacet\n" % tuple(row) for row in values.tolist()
+            )).encode("ascii"))
+
+    if not binary:
+        file.write(b"endsolid prosthetic\n")
+
+
+def read_stl(path):
+    """Read a binary or ASCII STL into a Mesh (vertices are not merged)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    # A binary file's size is fixed by its triangle count; ASCII files may also start with "solid"
+    count = int(np.frombuffer(data, dtype="<u4", count=1, offset=80)[0]) if len(data) >= 84 else -1
+    if len(data) == 84 + count * STL_TRIANGLE_DTYPE.itemsize:
+        vertices = np.frombuffer(data, dtype=STL_TRIANGLE_DTYPE, count=count, offset=84)["vertices"].reshape(-1, 3)
+    elif data.lstrip().startswith(b"solid"):
+        tokens = np.array(data.split())
+        starts = np.flatnonzero(tokens == b"vertex")
+        vertices = tokens[starts[:, np.newaxis] + np.arange(1, 4)].astype(np.float32)
+    else:
+        raise ValueError(f"{path} is not a valid STL file.")
+    return Mesh(vertices, np.arange(len(vertices), dtype=np.int32).reshape(-1, 3))
+
+
+def _pad4(data, fill=b"\x00"):
+    return data + fill * (-len(data) % 4)
+
+
+def _draco_encode(mesh):
+    """Draco-compress a mesh with DracoPy, or return None when it is not installed."""
+    try:
+        import DracoPy
+    except ImportError:
+        return None
+    return DracoPy.encode(
+        mesh.vertices, mesh.faces,
+        quantization_bits=DRACO_QUANTIZATION_BITS, compression_level=DRACO_COMPRESSION_LEVEL,
+    )
+
+
+def write_glb(mesh, file, quantize=True, draco=True):
+    """
+    Write a Mesh as a single-primitive binary glTF (GLB) with indexed, shared vertices.
+    - With `draco`, geometry is stored with KHR_draco_mesh_compression when
+      DracoPy is installed.
+    - Otherwise, with `quantize`, positions are stored as uint16 and vertex
+      normals as normalized int8 with KHR_mesh_quantization, dequantized by
+      the node transform; indices are uint16 whenever they fit.
+    - Draco output carries no normals; viewers compute them on load.
+    Returns the geometry encoding used: "draco", "quantized" or "float".
+    """
+    if isinstance(file, str):
+        with open(file, "wb") as f:
+            return write_glb(mesh, f, quantize, draco)
+
+    lower = mesh.vertices.min(axis=0) if len(mesh.vertices) else np.zeros(3, dtype=np.float32)
+    upper = mesh.vertices.max(axis=0) if len(mesh.vertices) else np.zeros(3, dtype=np.float32)
+    node = {"mesh": 0}
+    primitive = {"attributes": {"POSITION": 0}, "indices": 1, "mode": 4}
+    position = {"componentType": GL_FLOAT, "count": len(mesh.vertices), "type": "VEC3",
+                "min": lower.tolist(), "max": upper.tolist()}
+    indices = {"componentType": GL_UNSIGNED_INT, "count": mesh.faces.size, "type": "SCALAR"}
+    normal = {"componentType": GL_FLOAT, "count": len(mesh.vertices), "type": "VEC3"}
+    accessors = [position, indices]
+    extensions = []
+    buffer_views = []
+
+    draco_data = _draco_encode(mesh) if draco else None
+    if draco_data is not None:
+        encoding = "draco"
+        binary = _pad4(draco_data)
+        buffer_views.append({"buffer": 0, "byteOffset": 0, "byteLength": len(draco_data)})
+        primitive["extensions"] = {
+            "KHR_draco_mesh_compression": {"bufferView": 0, "attributes": {"POSITION": 0}},
+        }
+        extensions.append("KHR_draco_mesh_compression")
+    else:
+        if quantize:
+            encoding = "quantized"
+            scale = np.where(upper > lower, (upper - lower) / 65535.0, 1.0).astype(np.float32)
+            quantized = np.zeros((len(mesh.vertices), 4), dtype=np.uint16)  # padded to a 4-byte stride
+            quantized[:, :3] = np.rint((mesh.vertices - lower) / scale)
+            vertex_data, stride = quantized.tobytes(), 8
+            position.update(componentType=GL_UNSIGNED_SHORT,
+                            min=quantized[:, :3].min(axis=0).tolist() if len(quantized) else [0, 0, 0],
+                            max=quantized[:, :3].max(axis=0).tolist() if len(quantized) else [0, 0, 0])
+            node.update(translation=lower.tolist(), scale=scale.tolist())
+            # Normals live in the quantized space, which the node's normal matrix (1 / scale) maps back
+            normals = mesh.vertex_normals() * scale
+            lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+            np.divide(normals, lengths, out=normals, where=lengths > 0)
+            packed = np.zeros((len(mesh.vertices), 4), dtype=np.int8)  # padded to a 4-byte stride
+            packed[:, :3] = np.rint(normals * 127.0)
+            normal_data, normal_stride = packed.tobytes(), 4
+            normal.update(componentType=GL_BYTE, normalized=True)
+            extensions.append("KHR_mesh_quantization")
+        else:
+            encoding = "float"
+            vertex_data, stride = mesh.vertices.tobytes(), 12
+            normal_data, normal_stride = mesh.vertex_normals().tobytes(), 12
+        index_dtype = np.uint16 if len(mesh.vertices) <= 0xFFFF else np.uint32
+        indices["componentType"] = GL_UNSIGNED_SHORT if index_dtype == np.uint16 else GL_UNSIGNED_INT
+        index_data = mesh.faces.astype(index_dtype).tobytes()
+
+        binary = _pad4(vertex_data) + _pad4(index_data) + _pad4(normal_data)
+        buffer_views.append({"buffer": 0, "byteOffset": 0, "byteLength": len(vertex_data),
+                             "byteStride": stride, "target": GL_ARRAY_BUFFER})
+        buffer_views.append({"buffer": 0, "byteOffset": len(_pad4(vertex_data)), "byteLength": len(index_data),
+                             "target": GL_ELEMENT_ARRAY_BUFFER})
+        buffer_views.append({"buffer": 0, "byteOffset": len(_pad4(vertex_data)) + len(_pad4(index_data)),
+                             "byteLength": len(normal_data), "byteStride": normal_stride, "target": GL_ARRAY_BUFFER})
+        position["bufferView"], indices["bufferView"], normal["bufferView"] = 0, 1, 2
+        primitive["attributes"]["NORMAL"] = 2
+        accessors.append(normal)
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "prosthetic mesh"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [node],
+        "meshes": [{"primitives": [primitive]}],
+        "accessors": accessors,
+        "bufferViews": buffer_views,
+        "buffers": [{"byteLength": len(binary)}],
+    }
+    if extensions:
+        gltf["extensionsUsed"] = extensions
+        gltf["extensionsRequired"] = extensions
+
+    json_chunk = _pad4(json.dumps(gltf, separators=(",", ":")).encode(), b" ")
+    file.write(struct.pack("<III", GLB_MAGIC, 2, 12 + 8 + len(json_chunk) + 8 + len(binary)))
+    file.write(struct.pack("<II", len(json_chunk), GLB_JSON_CHUNK))
+    file.write(json_chunk)
+    file.write(struct.pack("<II", len(binary), GLB_BIN_CHUNK))
+    file.write(binary)
+    return encoding
+
+
+def compress_sidecar(data, encoding):
+    """Compress `data` for a Content-Encoding, or return None if the codec is unavailable."""
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "br":
+        try:
+            import brotli
+        except ImportError:
+            return None
+        return brotli.compress(data, quality=11)
+    raise ValueError(f"Unsupported encoding: {encoding}")
@@ -1,33 +1,421 @@
 # File: backend/intel/mesh_processing.py
 
 import os
-import trimesh
+import re
+import time
+import uuid
 import numpy as np
-from skimage import measure
-import open3d as o3d
+from intel2.mesh_io import Mesh, write_stl, write_glb, compress_sidecar, SIDECAR_ENCODINGS
+from intel2.mesh_analytics import COMPUTE_ORIENTED_BOUNDS, mesh_metrics
+from utils.volume_store import VolumeRef
 
+# skimage (and open3d, in mesh_io) are imported inside the functions that use
+# them, so the web process can import this module's paths and helpers cheaply.
 
-def process_mesh(segmentation_mask):
-    """Process segmentation mask into STL mesh with analysis."""
-    vertices, faces, _, _ = measure.marching_cubes(segmentation_mask, level=0)
-    mesh = trimesh.Trimesh(vertices=vertices, faces=faces)
+# Parameters that determine the generated mesh (part of the result cache key)
+# Masks are 0/1 after cleanup, so the surface sits halfway between the two values.
+MESH_PARAMS = {
+    "level": 0.5,
+    # Adaptive decimation: the full-detail triangle budget scales with surface
+    # area (in squared scan units) and with the surface's feature curvature,
+    # clamped to [min_triangles, max_triangles]. A typical 368x480 slab gets
+    # roughly the fixed 10k triangles meshes were previously decimated to.
+    "triangles_per_area": 0.07,
+    "curvature_weight": 1.0,
+    "min_triangles": 1000,
+    "max_triangles": 100000,
+    "max_error": None,  # Optional quadric error bound; decimation stops early once reached
+    # Level-of-detail outputs as fractions of the full-detail budget, finest first
+    "lod_ratios": [1.0, 0.25, 0.05],
+    "smoothing_iterations": 3,
+}
 
-    # Calculate mesh properties
-    bounding_box = mesh.bounding_box_oriented.volume
-    print(f"Bounding box volume: {bounding_box:.4f}")
+# Generated STL files, one per job or content hash
+STL_DIR = os.path.join("backend", "app", "static", "prosthetics")
+STL_RETENTION_SECONDS = int(os.environ.get("PROSTHETIC_STL_RETENTION_SECONDS", 24 * 3600))
+STL_RETAIN_COUNT = int(os.environ.get("PROSTHETIC_STL_RETAIN_COUNT", 500))
+STL_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+STL_BINARY = os.environ.get("PROSTHETIC_STL_FORMAT", "binary").lower() != "ascii"
 
-    # Convert to Open3D for processing
-    o3d_mesh = o3d.geometry.TriangleMesh()
-    o3d_mesh.vertices = o3d.utility.Vector3dVector(mesh.vertices)
-    o3d_mesh.triangles = o3d.utility.Vector3iVector(mesh.faces)
+# Viewer formats written next to every STL (comma-separated extensions), plus
+# precompressed sidecars (<file>.gz, <file>.br) for content negotiation.
+MESH_FORMATS = [
+    f".{ext.strip('. ')}" for ext in os.environ.get("PROSTHETIC_MESH_FORMATS", "glb").split(",") if ext.strip('. ')
+]
+GLB_QUANTIZE = os.environ.get("PROSTHETIC_GLB_QUANTIZE", "1") == "1"
+GLB_DRACO = os.environ.get("PROSTHETIC_GLB_DRACO", "1") == "1"  # Used when DracoPy is installed
+SIDECAR_MIN_BYTES = 1024  # Smaller files are not worth a compressed copy
+MESH_EXTENSIONS = (".stl", ".glb")
+MESH_MIMETYPES = {".stl": "model/stl", ".glb": "model/gltf-binary"}
+OUTPUT_SUFFIXES = MESH_EXTENSIONS + tuple(ext + sfx for ext in MESH_EXTENSIONS for sfx in SIDECAR_ENCODINGS.values())
 
-    # Simplify and smooth mesh
-    simplified_mesh = o3d_mesh.simplify_quadric_decimation(target_number_of_triangles=10000)
-    smoothed_mesh = simplified_mesh.filter_smooth_simple(number_of_iterations=3)
+# Block-parallel marching cubes: volumes deeper than one chunk are split into
+# slabs of MC_CHUNK_SLICES cubes, meshed as separate tasks on the job pool.
+MC_CHUNK_SLICES = int(os.environ.get("PROSTHETIC_MC_CHUNK_SLICES", 64))
 
-    # Save STL
-    stl_dir = "backend/app/static/prosthetics"
-    os.makedirs(stl_dir, exist_ok=True)
-    stl_path = os.path.join(stl_dir, "prosthetic_design.stl")
-    trimesh.Trimesh(np.asarray(smoothed_mesh.vertices), np.asarray(smoothed_mesh.triangles)).export(stl_path)
+
+def stl_path_for(stl_id, stl_dir=STL_DIR):
+    """Resolve an output id to its STL path, rejecting ids that could escape `stl_dir`."""
+    if not STL_ID_PATTERN.match(stl_id or ""):
+        raise ValueError(f"Invalid STL id: {stl_id!r}")
+    return os.path.join(stl_dir, f"{stl_id}.stl")
+
+
+def mesh_file_path(filename, stl_dir=STL_DIR):
+    """Resolve a served output file name (`<id>.stl`, `<id>_lod1.glb`, ...), rejecting anything else."""
+    stl_id, ext = os.path.splitext(filename)
+    if ext not in MESH_EXTENSIONS:
+        raise ValueError(f"Unsupported mesh file: {filename!r}")
+    return stl_path_for(stl_id, stl_dir)[:-len(".stl")] + ext
+
+
+def lod_path_for(stl_id, level, stl_dir=STL_DIR, ext=".stl"):
+    """Resolve the path of LOD `level` in format `ext`; level 0 is the full-detail `<stl_id><ext>`."""
+    stl_path = stl_path_for(stl_id if level == 0 else f"{stl_id}_lod{level}", stl_dir)
+    return stl_path[:-len(".stl")] + ext
+
+
+def lod_paths_for(stl_id, stl_dir=STL_DIR, ext=".stl"):
+    """Return the existing paths of an output in format `ext`, finest level first."""
+    paths = []
+    while os.path.exists(lod_path_for(stl_id, len(paths), stl_dir, ext)):
+        paths.append(lod_path_for(stl_id, len(paths), stl_dir, ext))
+    return paths
+
+
+def write_atomic(path, write):
+    """Call `write(tmp_path)` and rename the temporary file to `path`."""
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        result = write(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return result
+
+
+def write_stl_atomic(mesh, stl_path, binary=STL_BINARY):
+    """Write a Mesh to a temporary file and rename it into place."""
+    write_atomic(stl_path, lambda tmp_path: write_stl(mesh, tmp_path, binary))
     return stl_path
+
+
+def write_sidecars(path):
+    """Write precompressed copies of `path` for each available encoding; returns their paths."""
+    if os.path.getsize(path) < SIDECAR_MIN_BYTES:
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    sidecars = []
+    for encoding, suffix in SIDECAR_ENCODINGS.items():
+        compressed = compress_sidecar(data, encoding)
+        if compressed is None or len(compressed) >= len(data):
+            continue
+
+        def write(tmp_path, compressed=compressed):
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+
+        write_atomic(path + suffix, write)
+        sidecars.append(path + suffix)
+    return sidecars
+
+
+def write_mesh_outputs(mesh, stl_id, level=0, stl_dir=STL_DIR, formats=MESH_FORMATS):
+    """
+    Writes one level of detail as STL plus the compact viewer formats.
+    - The STL is the canonical download; each entry of `formats` (".glb") is
+      written next to it, and every file gets its compressed sidecars.
+    - Returns (paths, {file suffix: size in bytes}), the STL path first.
+    """
+    stl_path = write_stl_atomic(mesh, lod_path_for(stl_id, level, stl_dir))
+    paths = [stl_path]
+    for ext in formats:
+        if ext != ".glb":
+            raise ValueError(f"Unsupported mesh format: {ext}")
+        glb_path = lod_path_for(stl_id, level, stl_dir, ext)
+        write_atomic(glb_path, lambda tmp_path: write_glb(mesh, tmp_path, GLB_QUANTIZE, GLB_DRACO))
+        paths.append(glb_path)
+    for path in list(paths):
+        paths.extend(write_sidecars(path))
+
+    stem = lod_path_for(stl_id, level, stl_dir, "")
+    return paths, {path[len(stem):]: os.path.getsize(path) for path in paths}
+
+
+def cleanup_stl_outputs(stl_dir=STL_DIR, max_age_seconds=STL_RETENTION_SECONDS, retain_count=STL_RETAIN_COUNT,
+                        keep_prefixes=("cached_",)):
+    """
+    Applies the retention policy to generated STL files.
+    - Removes outputs older than `max_age_seconds`, then all but the newest `retain_count`.
+    - Files starting with one of `keep_prefixes` are managed elsewhere (e.g. the result cache).
+    """
+    if not os.path.isdir(stl_dir):
+        return []
+    now = time.time()
+    outputs = []
+    for name in os.listdir(stl_dir):
+        path = os.path.join(stl_dir, name)
+        if not name.endswith(OUTPUT_SUFFIXES) or name.startswith(keep_prefixes):
+            continue
+        try:
+            outputs.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            continue
+    outputs.sort(reverse=True)
+
+    removed = []
+    for index, (mtime, path) in enumerate(outputs):
+        if index >= retain_count or now - mtime > max_age_seconds:
+            try:
+                os.remove(path)
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+    return removed
+
+def as_volume(segmentation_mask):
+    """Return a 3D (slices, H, W) volume; a single 2D mask becomes a one-slice slab.
+
+    A utils.volume_store.VolumeRef is opened from its store; a bit-packed one
+    is unpacked in full, so extract_surface reads refs slab by slab instead.
+    """
+    if isinstance(segmentation_mask, VolumeRef):
+        segmentation_mask = segmentation_mask.open()
+    if segmentation_mask.ndim == 3:
+        return segmentation_mask
+    # extract_surface pads every face, so one slice still gives a closed slab
+    return segmentation_mask[np.newaxis]
+
+
+def _padded_slab(source, z0, z1):
+    """
+    Returns slices [z0, z1] (inclusive) of `source` (a VolumeRef or 3D array)
+    as if the whole volume were padded with one empty voxel on every face.
+    - z counts the padding slice, so padded slice z is slice z - 1 of `source`
+      and the padded volume has `source.shape[0] + 2` slices.
+    - Only the slab is read, so a bit-packed VolumeRef is unpacked per slab.
+    """
+    depth = source.shape[0]
+    start, stop = max(z0 - 1, 0), min(z1, depth)
+    slab = source.read_slices(start, stop) if isinstance(source, VolumeRef) else source[start:stop]
+    before = start - (z0 - 1)
+    after = z1 - z0 + 1 - before - (stop - start)
+    return np.pad(slab, ((before, after), (1, 1), (1, 1)))
+
+
+def _chunk_surface(source, z0, z1, level):
+    """
+    Runs marching cubes on slices [z0, z1] (inclusive) of the padded volume.
+    - `source` is a VolumeRef, read and padded here so only the chunk is mapped
+      or unpacked, or the padded chunk array itself (see `_padded_slab`).
+    - Returns (vertices, faces) in padded voxel index units with z offset by
+      `z0`, or None when the chunk contains no surface at `level`.
+    """
+    from skimage import measure
+
+    chunk = _padded_slab(source, z0, z1) if isinstance(source, VolumeRef) else source
+    # Cheap occupancy precheck: a chunk that is all inside or all outside has no surface
+    low, high = chunk.min(), chunk.max()
+    if low == high or not low <= level <= high:
+        return None
+    vertices, faces, _, _ = measure.marching_cubes(chunk, level=level)
+    vertices[:, 0] += z0
+    return vertices, faces
+
+
+def _weld_chunks(parts):
+    """
+    Stitches per-chunk meshes into one indexed mesh.
+    - Adjacent chunks share one slice, so their border vertices are computed from
+      the same voxels and are bitwise identical; merging exact duplicates welds
+      the seams without introducing new geometry.
+    """
+    vertex_offsets = np.cumsum([0] + [len(v) for v, _ in parts[:-1]])
+    vertices = np.concatenate([v for v, _ in parts])
+    faces = np.concatenate([f + offset for (_, f), offset in zip(parts, vertex_offsets)])
+    vertices, inverse = np.unique(vertices, axis=0, return_inverse=True)
+    return vertices, inverse.reshape(-1)[faces]
+
+
+def extract_surface(segmentation_mask, level, spacing=(1.0, 1.0, 1.0), chunk_slices=MC_CHUNK_SLICES, submit=None):
+    """
+    Extracts the iso-surface of a mask volume, block-parallel for deep volumes.
+    - With `submit` (e.g. utils.jobs.job_manager.submit_cpu, returning a
+      Future), marching cubes runs as tasks on the caller's pool, counting
+      against its worker cap: volumes with more than `chunk_slices` cubes
+      along z are split into slabs overlapping by one slice and welded,
+      giving the same watertight surface as a single marching cubes pass.
+    - Otherwise an array is meshed in one pass in this process, and a
+      VolumeRef slab by slab in this process, so a bit-packed volume is only
+      ever unpacked one slab at a time.
+    - The volume is treated as padded with one empty voxel on every face, so
+      foreground touching the first or last slice or the image border is
+      closed off and the surface is watertight.
+    - Returns (vertices, faces) with vertices scaled by `spacing`.
+    """
+    source = segmentation_mask if isinstance(segmentation_mask, VolumeRef) else as_volume(segmentation_mask)
+    padded_depth = source.shape[0] + 2
+    if submit is None and not isinstance(source, VolumeRef):
+        from skimage import measure
+
+        vertices, faces, _, _ = measure.marching_cubes(np.pad(source, 1), level=level)
+        return (vertices - 1) * np.asarray(spacing, dtype=vertices.dtype), faces
+
+    bounds = [(z0, min(z0 + chunk_slices, padded_depth - 1)) for z0 in range(0, padded_depth - 1, chunk_slices)]
+    tasks = [
+        (source if isinstance(source, VolumeRef) else _padded_slab(source, z0, z1), z0, z1, level)
+        for z0, z1 in bounds
+    ]
+    if submit is None:
+        results = [_chunk_surface(*task) for task in tasks]
+    else:
+        futures = [submit(_chunk_surface, *task) for task in tasks]
+        results = [future.result() for future in futures]
+    parts = [part for part in results if part is not None]
+    if not parts:
+        raise ValueError(f"Segmentation contains no surface at level {level}.")
+
+    vertices, faces = _weld_chunks(parts) if len(parts) > 1 else parts[0]
+    # Undo the padding offset, so vertices are in the unpadded volume's index space
+    return (vertices - 1) * np.asarray(spacing, dtype=vertices.dtype), faces
+
+
+def _mean_dihedral_angle(mesh):
+    """Mean angle in radians between the normals of faces sharing an edge."""
+    normals = mesh.face_normals()
+
+    # Encode each undirected edge as one integer so shared edges sort next to each other
+    edges = np.sort(mesh.faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1).astype(np.int64)
+    edge_keys = edges[:, 0] * len(mesh.vertices) + edges[:, 1]
+    order = np.argsort(edge_keys, kind="stable")
+    edge_faces = np.repeat(np.arange(len(mesh.faces)), 3)[order]
+    shared = edge_keys[order][1:] == edge_keys[order][:-1]
+    if not shared.any():
+        return 0.0
+    cosines = np.einsum("ij,ij->i", normals[edge_faces[:-1][shared]], normals[edge_faces[1:][shared]])
+    return float(np.arccos(np.clip(cosines, -1.0, 1.0)).mean())
+
+
+def decimation_target(mesh, params=MESH_PARAMS):
+    """
+    Picks the full-detail triangle budget for a mesh.
+    - The budget grows with surface area, so small meshes are not decimated
+      to the same count as large ones, and is raised for surfaces with sharp
+      features (a high mean dihedral angle) so they keep their detail.
+    - Area and curvature are measured after the delivered smoothing, so the
+      voxel staircase of marching cubes output does not count as features.
+    - Never exceeds the mesh's own triangle count.
+    - Returns (target, {"area": ..., "curvature": ...}).
+    """
+    from skimage import measure
+
+    smoothed = mesh.smooth_simple(params["smoothing_iterations"])
+    area = float(measure.mesh_surface_area(smoothed.vertices, smoothed.faces))
+    curvature = _mean_dihedral_angle(smoothed)
+    target = area * params["triangles_per_area"] * (1.0 + params["curvature_weight"] * curvature / (np.pi / 2))
+    target = int(np.clip(target, params["min_triangles"], params["max_triangles"]))
+    return min(target, len(mesh)), {"area": area, "curvature": curvature}
+
+
+def decimate_lods(mesh, target, params=MESH_PARAMS):
+    """
+    Builds the level-of-detail meshes in one progressive pass.
+    - Each level is decimated from the previous (unsmoothed) level, so coarse
+      levels cost little extra; levels already within budget are not decimated.
+    - The mesh is converted to Open3D once, on the first level that needs
+      decimating, and stays there for the coarser levels; smoothing runs on
+      the NumPy arrays.
+    - Returns a list of (smoothed Mesh, metrics) pairs, finest first.
+    """
+    max_error = params["max_error"] if params["max_error"] is not None else float("inf")
+    lods = []
+    current, current_o3d = mesh, None
+    for level, ratio in enumerate(params["lod_ratios"]):
+        level_target = max(4, int(target * ratio))
+        start = time.perf_counter()
+        if len(current) > level_target:
+            if current_o3d is None:
+                current_o3d = current.to_open3d()
+            current_o3d = current_o3d.simplify_quadric_decimation(
+                target_number_of_triangles=level_target, maximum_error=max_error
+            )
+            current = Mesh.from_open3d(current_o3d)
+        decimate_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        smoothed = current.smooth_simple(params["smoothing_iterations"])
+        smooth_seconds = time.perf_counter() - start
+
+        metrics = {
+            "level": level,
+            "target_triangles": level_target,
+            "triangles": len(smoothed.faces),
+            "vertices": len(smoothed.vertices),
+            "decimate_seconds": decimate_seconds,
+            "smooth_seconds": smooth_seconds,
+        }
+        print(f"LOD {level}: {metrics['triangles']} triangles "
+              f"(decimate {decimate_seconds:.3f}s, smooth {smooth_seconds:.3f}s)")
+        lods.append((smoothed, metrics))
+    return lods
+
+
+def process_mesh(segmentation_mask, stl_id=None, stl_dir=STL_DIR, spacing=(1.0, 1.0, 1.0),
+                 oriented_bounds=COMPUTE_ORIENTED_BOUNDS):
+    """Process segmentation mask into STL meshes with analysis.
+
+    `segmentation_mask` may also be a Mesh already extracted with
+    `extract_surface` (e.g. block-parallel on the job pool), in scan units.
+
+    Writes one STL per level of detail: the full-detail mesh to
+    `<stl_dir>/<stl_id>.stl` and coarser levels to `<stl_id>_lod<N>.stl`, each
+    atomically, together with the MESH_FORMATS viewer files and compressed
+    sidecars (see `write_mesh_outputs`). A random id is used when none is given, so concurrent jobs
+    never share an output file. `spacing` is the (z, y, x) voxel size, so
+    vertices come out in scan units. The oriented bounding box is only added
+    to the metrics with `oriented_bounds=True`.
+
+    Returns {"stl_path": ..., "lod_paths": [...], "files": [...], "metrics": {...}, "decimation": {...}},
+    `files` listing every written file.
+    """
+    if isinstance(segmentation_mask, Mesh):
+        mesh = segmentation_mask
+    else:
+        mesh = Mesh(*extract_surface(segmentation_mask, MESH_PARAMS["level"], spacing))
+    target, surface = decimation_target(mesh)
+
+    # Simplify and smooth every level of detail
+    lods = decimate_lods(mesh, target)
+
+    # Calculate mesh properties of the delivered full-detail mesh
+    metrics = mesh_metrics(lods[0][0], oriented_bounds)
+    print(f"Mesh volume: {metrics['volume']:.4f}, surface area: {metrics['surface_area']:.4f}, "
+          f"AABB extents: {metrics['aabb']['extents']}")
+
+    # Save STLs and viewer formats
+    os.makedirs(stl_dir, exist_ok=True)
+    stl_id = stl_id or uuid.uuid4().hex
+    lod_paths, files = [], []
+    for level, (lod_mesh, lod_metrics) in enumerate(lods):
+        start = time.perf_counter()
+        paths, lod_metrics["bytes"] = write_mesh_outputs(lod_mesh, stl_id, level, stl_dir)
+        lod_metrics["write_seconds"] = time.perf_counter() - start
+        lod_paths.append(paths[0])
+        files.extend(paths)
+
+    return {
+        "stl_path": lod_paths[0],
+        "lod_paths": lod_paths,
+        "files": files,
+        "metrics": metrics,
+        "decimation": {
+            "input_triangles": len(mesh),
+            "target_triangles": target,
+            "surface_area": surface["area"],
+            "mean_dihedral_angle": surface["curvature"],
+            "lods": [lod_metrics for _, lod_metrics in lods],
+        },
+    }
@@ -0,0 +1,183 @@
+# File: backend/app/intel2/model_zoo.py
+
+import os
+import json
+import argparse
+import threading
+from utils.image_preprocessing import MODEL_INPUT_SHAPE
+
+# Variants of the segmentation model, described next to the IR folders in backend/intel
+MODEL_ZOO_FILE = os.environ.get(
+    "PROSTHETIC_MODEL_ZOO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "intel", "model_zoo.json"),
+)
+
+# Quality tiers: the largest validation Dice drop below the most accurate
+# candidate that each tier accepts (None accepts any); the fastest accepted
+# variant is chosen.
+QUALITY_TIERS = {"quality": 0.0, "balanced": 0.01, "fast": None}
+
+
+class ModelZoo:
+    """
+    Model variants described by a JSON config, for per-request routing.
+    - Each variant has a `model_path` (relative to the config file), its
+      `precision`, the `input_shape` it runs at, optional registry
+      `transforms` (e.g. "reshape:192x240"), an optional compile `config` per
+      device (e.g. CPU sparse weight decompression) and, once measured with this
+      module's command line, its p50 `latency_ms` per device and validation `dice`.
+    - Variants whose IR file is missing, or that are unmeasured on the
+      requested device, are never routed to.
+    """
+
+    def __init__(self, path=MODEL_ZOO_FILE):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """(Re)read the config file."""
+        with open(self.path) as f:
+            config = json.load(f)
+        base = os.path.dirname(self.path)
+        variants = {}
+        for name, spec in config["variants"].items():
+            variants[name] = {
+                **spec,
+                "name": name,
+                "model_path": os.path.normpath(os.path.join(base, spec["model_path"])),
+                "transforms": tuple(spec.get("transforms", ())),
+                "input_shape": tuple(spec.get("input_shape", MODEL_INPUT_SHAPE)),
+                "latency_ms": dict(spec.get("latency_ms") or {}),
+                "config": dict(spec.get("config") or {}),
+            }
+        with self._lock:
+            self._config = config
+            self.variants = variants
+
+    def variant(self, name):
+        """Return the description of variant `name`."""
+        if name not in self.variants:
+            raise ValueError(f"Unknown model variant {name!r}; expected one of {', '.join(self.variants)}.")
+        return self.variants[name]
+
+    def model_path(self, name):
+        return self.variant(name)["model_path"]
+
+    def compile_config(self, name, device="CPU"):
+        """Compile config of variant `name` on `device`, or None."""
+        return self.variant(name)["config"].get(device) or None
+
+    def candidates(self, device="CPU"):
+        """Variants that exist on disk and have a measured latency on `device` and Dice."""
+        return [
+            variant for variant in self.variants.values()
+            if os.path.exists(variant["model_path"])
+            and variant["latency_ms"].get(device) is not None and variant.get("dice") is not None
+        ]
+
+    def select(self, tier=None, latency_budget_ms=None, device="CPU"):
+        """
+        Picks the variant for a request, or None for the default serving model.
+        - `latency_budget_ms` keeps the variants at or under the budget; if
+          none qualifies, the fastest variant is used.
+        - `tier` (see QUALITY_TIERS) then picks the fastest variant within
+          the tier's Dice drop; with only a budget, the most accurate one.
+        """
+        if tier is not None and tier not in QUALITY_TIERS:
+            raise ValueError(f"Unknown quality tier {tier!r}; expected one of {', '.join(QUALITY_TIERS)}.")
+        if latency_budget_ms is not None and latency_budget_ms <= 0:
+            raise ValueError("latency_budget_ms must be positive.")
+        if tier is None and latency_budget_ms is None:
+            return None
+
+        candidates = self.candidates(device)
+        if not candidates:
+            print(f"Warning: no measured model variants for {device}, using the default model.")
+            return None
+
+        def latency(variant):
+            return variant["latency_ms"][device]
+
+        if latency_budget_ms is not None:
+            within_budget = [variant for variant in candidates if latency(variant) <= latency_budget_ms]
+            if not within_budget:
+                return min(candidates, key=latency)["name"]
+            candidates = within_budget
+
+        max_drop = QUALITY_TIERS[tier or "quality"]
+        best = max(variant["dice"] for variant in candidates)
+        if max_drop is not None:
+            candidates = [variant for variant in candidates if best - variant["dice"] <= max_drop + 1e-9]
+        return min(candidates, key=lambda variant: (latency(variant), -variant["dice"]))["name"]
+
+    def record(self, name, device, latency_ms, dice, **fields):
+        """Store measured latency and Dice (plus any other `fields`) for `name` and write the config back."""
+        with self._lock:
+            spec = self._config["variants"][name]
+            spec.update(fields)
+            spec["latency_ms"] = {**(spec.get("latency_ms") or {}), device: round(latency_ms, 3)}
+            spec["dice"] = round(dice, 5)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._config, f, indent=2)
+                f.write("\n")
+            os.replace(tmp_path, self.path)
+        self.reload()
+
+
+# Loaded once per process; the command line below refreshes the measurements
+model_zoo = ModelZoo()
+
+
+def measure(names, validation_set, device="CPU", warmup=5, iterations=50, zoo=model_zoo):
+    """Benchmark and validate each variant in `names`, recording the results in the zoo config."""
+    from intel2.benchmark import benchmark_model, format_result
+    from intel2.compiled_models import get_compiled_model
+    from intel2.validation import evaluate
+
+    image_path = validation_set.inputs.image_paths[0]
+    for name in names:
+        variant = zoo.variant(name)
+        if not os.path.exists(variant["model_path"]):
+            print(f"Skipping {name}: {variant['model_path']} does not exist.")
+            continue
+        config = zoo.compile_config(name, device)
+        result = benchmark_model(
+            variant["model_path"], image_path, device, warmup, iterations, variant["transforms"], config
+        )
+        compiled_model = get_compiled_model(variant["model_path"], device, config, variant["transforms"])
+        scores = evaluate(compiled_model, validation_set, variant["input_shape"])
+        zoo.record(name, device, result["stages"]["total"]["p50_ms"], scores["dice"])
+        print(f"{format_result(f'{name}-{device}', result)} | IoU {scores['iou']:.4f} | Dice {scores['dice']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the model variants or measure their latency and accuracy.")
+    parser.add_argument("--measure", action="store_true", help="Benchmark and validate the variants")
+    parser.add_argument("--variants", type=str, default=None, help="Comma-separated variants (default: all)")
+    parser.add_argument("--validation_images", type=str, help="Validation scans")
+    parser.add_argument("--validation_masks", type=str, help="Ground-truth masks, named like the validation scans")
+    parser.add_argument("--device", type=str, default="CPU", help="Device to measure on")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed warmup iterations per variant")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed iterations per variant")
+    args = parser.parse_args()
+
+    names = args.variants.split(",") if args.variants else list(model_zoo.variants)
+    if args.measure:
+        if not (args.validation_images and args.validation_masks):
+            parser.error("--measure needs --validation_images and --validation_masks")
+        from intel2.validation import ValidationSet
+
+        measure(names, ValidationSet(args.validation_images, args.validation_masks), args.device,
+                args.warmup, args.iterations)
+
+    for name in names:
+        variant = model_zoo.variant(name)
+        status = "ok" if os.path.exists(variant["model_path"]) else "missing"
+        print(f"{name}: {variant['precision']} {list(variant['input_shape'])} | latency {variant['latency_ms']} | "
+              f"Dice {variant.get('dice')} | {status} {variant['model_path']}")
+
+
+if __name__ == "__main__":
+    main()
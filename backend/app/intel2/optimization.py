@@ -1,77 +1,319 @@
 import os
+import json
+import time
+import math
+import shutil
+import argparse
 import numpy as np
-import cv2
+import nncf
 from nncf import quantize
+from nncf.quantization.advanced_parameters import AdvancedAccuracyRestorerParameters
 from openvino.runtime import Core
 from openvino.runtime import serialize
+from openvino.runtime import opset8 as ops
+from intel2.calibration import CalibrationDataset, CALIBRATION_CACHE_DIR, DECODE_WORKERS
+from intel2.inference import SERVING_MODEL_FILE
+from intel2.model_zoo import model_zoo
+from intel2.validation import ValidationSet, VALIDATION_METRIC, evaluate, input_of, validation_score
 
-# Paths to the original IR model
-MODEL_XML = "C:/Users/soumy/OneDrive/Desktop/AI_Enabled_Prosthetic_Design/backend/intel/unet-camvid-onnx-0001/FP16/unet-camvid-onnx-0001.xml"
-MODEL_BIN = "C:/Users/soumy/OneDrive/Desktop/AI_Enabled_Prosthetic_Design/backend/intel/unet-camvid-onnx-0001/FP16/unet-camvid-onnx-0001.bin"
+# Paths to the original IR model (see backend/intel/model_zoo.json)
+MODEL_XML = model_zoo.model_path("FP16")
+MODEL_BIN = os.path.splitext(MODEL_XML)[0] + ".bin"
 
 # Directory for optimized model
-OUTPUT_DIR = "C:/Users/soumy/OneDrive/Desktop/AI_Enabled_Prosthetic_Design/backend/intel/unet-camvid-onnx-0001/FP16/optimized_nncf/"
+OUTPUT_DIR = os.path.dirname(model_zoo.model_path("INT8"))
 
-# Dataset for calibration
-DATASET_DIR = "C:/Users/soumy/OneDrive/Desktop/AI_Enabled_Prosthetic_Design/backend/dataset/images/"
+# Dataset root (backend/dataset by default), overridable through the environment
+DATASET_ROOT = os.environ.get(
+    "PROSTHETIC_DATASET_DIR",
+    os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "dataset")),
+)
 
-class CalibrationDataset:
-    """Wrapper dataset class for NNCF calibration."""
-    def __init__(self, dataset_dir):
-        self.image_paths = [
-            os.path.join(dataset_dir, img_name) for img_name in os.listdir(dataset_dir)
-        ]
+# Dataset for calibration
+DATASET_DIR = os.path.join(DATASET_ROOT, "images")
+CALIBRATION_SUBSET_SIZE = 300  # NNCF's default number of calibration samples
 
-    def __len__(self):
-        return len(self.image_paths)
+# Validation scans and their ground-truth masks, paired by file name
+VALIDATION_IMAGES_DIR = os.path.join(DATASET_ROOT, "validation", "images")
+VALIDATION_MASKS_DIR = os.path.join(DATASET_ROOT, "validation", "masks")
 
-    def __getitem__(self, idx):
-        # Read the image
-        image = cv2.imread(self.image_paths[idx])
-        if image is None:
-            raise ValueError(f"Failed to read image at: {self.image_paths[idx]}")
+# Largest absolute drop in validation Dice accepted from quantization
+MAX_ACCURACY_DROP = 0.01
+MAX_RESTORER_ITERATIONS = None  # Cap on accuracy-restoring iterations; None keeps NNCF's default (no cap)
 
-        # Resize the image to match the model's input shape
-        resized_image = cv2.resize(image, (480, 368))  # Note: Width=480, Height=368
-        normalized_image = resized_image / 255.0
-        transposed_image = normalized_image.transpose(2, 0, 1)  # Channels-first
-        return np.expand_dims(transposed_image.astype(np.float32), axis=0)
+# Optional compression stage before INT8: unstructured magnitude sparsity of the weights
+SPARSIFIED_OPS = ("Convolution", "ConvolutionBackpropData", "MatMul")
+SPARSE_VARIANT = "INT8-sparse"  # Model zoo variant the best sparsity setting is published as
+# Settings are ranked by throughput per Dice point lost; drops below this floor count as noise
+ACCURACY_DROP_FLOOR = 0.001
 
-    def get_batch_size(self):
-        return 1  # Required for NNCF calibration
+def sparsify_weights(model, sparsity):
+    """
+    Zeroes the smallest-magnitude `sparsity` fraction of every weight tensor.
+    - Covers Convolution, ConvolutionBackpropData and MatMul weights,
+      including FP16 weights behind a Convert.
+    - NNCF quantizes weights symmetrically, so the zeros stay exact in INT8.
+    Returns the model and the fraction of weights that are zero.
+    """
+    zeros = total = 0
+    for node in model.get_ordered_ops():
+        if node.get_type_name() not in SPARSIFIED_OPS:
+            continue
+        source = node.input_value(1).get_node()
+        if source.get_type_name() == "Convert":
+            source = source.input_value(0).get_node()
+        if source.get_type_name() != "Constant":
+            continue
 
-    def get_length(self):
-        """Return the length of the dataset."""
-        return len(self.image_paths)
+        weights = source.get_data()
+        magnitudes = np.abs(weights.astype(np.float32))
+        count = math.ceil(sparsity * magnitudes.size)
+        if count:
+            threshold = np.partition(magnitudes.ravel(), count - 1)[count - 1]
+            replacement = ops.constant(np.where(magnitudes <= threshold, 0, weights).astype(weights.dtype))
+            replacement.set_friendly_name(source.get_friendly_name())
+            for target in source.output(0).get_target_inputs():
+                target.replace_source_output(replacement.output(0))
+            weights = replacement.get_data()
+        zeros += int(np.count_nonzero(weights == 0))
+        total += weights.size
 
-    def get_inference_data(self):
-        """Yield inference-ready data samples."""
-        for idx in range(len(self)):
-            yield self[idx]
+    model.validate_nodes_and_infer_types()
+    return model, zeros / total if total else 0.0
 
+def sparse_weights_config(sparsity, device="CPU"):
+    """Compile config letting the CPU plugin pack INT8 weights at least `sparsity` sparse."""
+    if device != "CPU" or not sparsity:
+        return None
+    return {"CPU_SPARSE_WEIGHTS_DECOMPRESSION_RATE": str(sparsity)}
 
-def optimize_model_with_nncf():
-    """Optimize the OpenVINO model using NNCF quantization."""
+def optimize_model_with_nncf(dataset_dir=DATASET_DIR, subset_size=CALIBRATION_SUBSET_SIZE,
+                             cache_dir=CALIBRATION_CACHE_DIR, workers=DECODE_WORKERS, sparsity=0.0):
+    """Optimize the OpenVINO model using NNCF quantization, optionally sparsifying its weights first."""
     # Initialize OpenVINO runtime
     core = Core()
-    
+
     # Load the IR model
     model = core.read_model(model=MODEL_XML, weights=MODEL_BIN)
+    name = "optimized_model"
+    if sparsity:
+        model, reached = sparsify_weights(model, sparsity)
+        name = f"sparse{round(sparsity * 100)}_int8_model"
+        print(f"Sparsified weights to {reached:.1%} zeros")
 
-    # Load calibration dataset
-    calibration_dataset = CalibrationDataset(DATASET_DIR)
+    # Load calibration dataset (decoded in parallel, cached as float32 for repeat runs)
+    calibration_dataset = CalibrationDataset(dataset_dir, subset_size, cache_dir, workers)
 
     # Perform quantization using NNCF
-    optimized_model = quantize(model, calibration_dataset=calibration_dataset)
+    optimized_model = quantize(
+        model, calibration_dataset=nncf.Dataset(calibration_dataset), subset_size=len(calibration_dataset)
+    )
 
     # Save the optimized model
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    optimized_model_xml = os.path.join(OUTPUT_DIR, "optimized_model.xml")
-    optimized_model_bin = os.path.join(OUTPUT_DIR, "optimized_model.bin")
+    optimized_model_xml = os.path.join(OUTPUT_DIR, f"{name}.xml")
+    optimized_model_bin = os.path.join(OUTPUT_DIR, f"{name}.bin")
     serialize(optimized_model, optimized_model_xml, optimized_model_bin)
 
     print(f"Optimized model saved to: {optimized_model_xml} and {optimized_model_bin}")
+    return optimized_model_xml
+
+
+def optimize_model_with_accuracy_control(validation_set, dataset_dir=DATASET_DIR, subset_size=CALIBRATION_SUBSET_SIZE,
+                                         cache_dir=CALIBRATION_CACHE_DIR, workers=DECODE_WORKERS,
+                                         max_drop=MAX_ACCURACY_DROP, max_iterations=MAX_RESTORER_ITERATIONS):
+    """
+    Quantizes the model to INT8 while keeping validation Dice within `max_drop`.
+    - NNCF quantizes, ranks the quantized layers by their effect on the
+      metric and reverts the most sensitive ones to their original
+      floating-point precision until the drop is met.
+    - The absolute drop is measured against the original model on `validation_set`.
+    """
+    core = Core()
+    model = core.read_model(model=MODEL_XML, weights=MODEL_BIN)
+    calibration_dataset = CalibrationDataset(dataset_dir, subset_size, cache_dir, workers)
+
+    restorer_parameters = AdvancedAccuracyRestorerParameters()
+    if max_iterations is not None:
+        restorer_parameters.max_num_iterations = max_iterations
+
+    optimized_model = nncf.quantize_with_accuracy_control(
+        model,
+        calibration_dataset=nncf.Dataset(calibration_dataset),
+        validation_dataset=nncf.Dataset(validation_set, input_of),
+        validation_fn=validation_score,
+        max_drop=max_drop,
+        drop_type=nncf.DropType.ABSOLUTE,
+        subset_size=len(calibration_dataset),
+        advanced_accuracy_restorer_parameters=restorer_parameters,
+    )
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    optimized_model_xml = os.path.join(OUTPUT_DIR, "accuracy_controlled_model.xml")
+    optimized_model_bin = os.path.join(OUTPUT_DIR, "accuracy_controlled_model.bin")
+    serialize(optimized_model, optimized_model_xml, optimized_model_bin)
+
+    print(f"Accuracy-controlled model saved to: {optimized_model_xml} and {optimized_model_bin}")
+    return optimized_model_xml
+
+
+def quantization_report(candidates, validation_set, device="CPU", warmup=5, iterations=50,
+                        max_drop=MAX_ACCURACY_DROP, configs=None):
+    """
+    Measures latency and segmentation quality of each candidate model.
+    - `candidates` maps a label to an IR path; the first entry is the
+      reference that accuracy drops are measured against.
+    - `configs` optionally maps a label to its compile config.
+    - Latency comes from the benchmark harness (intel2/benchmark.py), run on
+      the first validation scan.
+    Returns one row per candidate, in order.
+    """
+    from intel2.benchmark import benchmark_model
+    from intel2.compiled_models import get_compiled_model
+
+    rows = []
+    reference = None
+    for label, model_path in candidates.items():
+        config = (configs or {}).get(label)
+        scores = evaluate(get_compiled_model(model_path, device, config), validation_set)
+        result = benchmark_model(
+            model_path, validation_set.inputs.image_paths[0], device, warmup, iterations, config=config
+        )
+        reference = reference or scores
+        drop = reference[VALIDATION_METRIC] - scores[VALIDATION_METRIC]
+        total = result["stages"]["total"]
+        rows.append({
+            "label": label,
+            "model_path": model_path,
+            "device": device,
+            "config": config,
+            "p50_ms": total["p50_ms"],
+            "p90_ms": total["p90_ms"],
+            "throughput_fps": total["throughput_fps"],
+            **scores,
+            "accuracy_drop": drop,
+            "within_budget": drop <= max_drop,
+            "throughput_per_drop": total["throughput_fps"] / (max(drop, 0.0) + ACCURACY_DROP_FLOOR),
+        })
+        print(f"{label}-{device}: p50 {total['p50_ms']:.2f} ms | {total['throughput_fps']:.1f} img/s | "
+              f"IoU {scores['iou']:.4f} | Dice {scores['dice']:.4f} | drop {drop:+.4f}")
+    return rows
+
+
+def select_model(rows):
+    """Return the lowest-latency row whose accuracy drop is within budget."""
+    eligible = [row for row in rows if row["within_budget"]]
+    if not eligible:
+        raise ValueError("No candidate model meets the accuracy budget.")
+    return min(eligible, key=lambda row: row["p50_ms"])
+
+
+def select_sparse_setting(rows):
+    """Return the within-budget sparse row with the best throughput per unit of accuracy loss, or None."""
+    eligible = [row for row in rows if row.get("sparsity") and row["within_budget"]]
+    return max(eligible, key=lambda row: row["throughput_per_drop"]) if eligible else None
+
+
+def publish_sparse_variant(row, name=SPARSE_VARIANT, zoo=model_zoo):
+    """Copy the chosen sparse model to the zoo variant's path and record its measurements and config."""
+    target_xml = zoo.model_path(name)
+    os.makedirs(os.path.dirname(target_xml), exist_ok=True)
+    for ext in (".xml", ".bin"):
+        shutil.copyfile(os.path.splitext(row["model_path"])[0] + ext, os.path.splitext(target_xml)[0] + ext)
+    zoo.record(name, row["device"], row["p50_ms"], row["dice"], sparsity=row["sparsity"],
+               config={row["device"]: row["config"]} if row["config"] else {})
+    print(f"Published {row['label']} as model variant {name} ({target_xml})")
+
+
+def register_serving_model(row, path=SERVING_MODEL_FILE):
+    """Record `row`'s model and compile config as the ones the inference server loads (see serving_model_xml)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({**row, "model_path": os.path.abspath(row["model_path"]), "registered_at": time.time()}, f, indent=2)
+    os.replace(tmp_path, path)
+    print(f"Registered {row['label']} ({row['model_path']}) for serving in {path}; restart the server to load it.")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Quantize the segmentation model with NNCF, compare latency and accuracy, and register the best model."
+    )
+    parser.add_argument("--dataset_dir", type=str, default=DATASET_DIR, help="Calibration images (searched recursively)")
+    parser.add_argument("--subset_size", type=int, default=CALIBRATION_SUBSET_SIZE,
+                        help="Calibration images, sampled stratified by sub-folder")
+    parser.add_argument("--cache_dir", type=str, default=CALIBRATION_CACHE_DIR,
+                        help="Folder for cached preprocessed tensors ('' disables the cache)")
+    parser.add_argument("--workers", type=int, default=DECODE_WORKERS, help="Image decoding threads")
+    parser.add_argument("--validation_images", type=str, default=VALIDATION_IMAGES_DIR, help="Validation scans")
+    parser.add_argument("--validation_masks", type=str, default=VALIDATION_MASKS_DIR,
+                        help="Ground-truth masks, named like the validation scans")
+    parser.add_argument("--validation_size", type=int, default=None, help="Validation scans to use (default: all)")
+    parser.add_argument("--max_drop", type=float, default=MAX_ACCURACY_DROP, help="Largest accepted absolute Dice drop")
+    parser.add_argument("--max_iterations", type=int, default=MAX_RESTORER_ITERATIONS,
+                        help="Cap on layers reverted to floating point by accuracy control")
+    parser.add_argument("--ptq_only", action="store_true", help="Only run plain INT8 quantization (no validation)")
+    parser.add_argument("--no_accuracy_control", action="store_true", help="Skip accuracy-controlled quantization")
+    parser.add_argument("--sparsity", type=str, default="",
+                        help="Comma-separated weight sparsity levels to try before INT8, e.g. 0.3,0.5,0.7")
+    parser.add_argument("--device", type=str, default="CPU", help="Device for the latency/accuracy report")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed warmup iterations per model")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed iterations per model")
+    parser.add_argument("--report", type=str, default=os.path.join(OUTPUT_DIR, "quantization_report.json"),
+                        help="Where to write the latency/accuracy report")
+    parser.add_argument("--no_register", action="store_true", help="Report only; leave the serving model unchanged")
+    args = parser.parse_args()
+    cache_dir = args.cache_dir or None
+
+    ptq_xml = optimize_model_with_nncf(args.dataset_dir, args.subset_size, cache_dir, args.workers)
+    if args.ptq_only:
+        return
+
+    validation_set = ValidationSet(args.validation_images, args.validation_masks, args.validation_size,
+                                   cache_dir, args.workers)
+    candidates = {"FP16": MODEL_XML, "INT8": ptq_xml}
+    if not args.no_accuracy_control:
+        candidates["INT8-accuracy-control"] = optimize_model_with_accuracy_control(
+            validation_set, args.dataset_dir, args.subset_size, cache_dir, args.workers, args.max_drop,
+            args.max_iterations,
+        )
+
+    sparsity_levels = {}
+    configs = {}
+    for level in (float(value) for value in args.sparsity.split(",") if value.strip()):
+        if not 0.0 < level < 1.0:
+            parser.error(f"sparsity levels must be between 0 and 1, got {level}")
+        label = f"INT8-sparse{round(level * 100)}"
+        candidates[label] = optimize_model_with_nncf(args.dataset_dir, args.subset_size, cache_dir, args.workers, level)
+        sparsity_levels[label] = level
+        configs[label] = sparse_weights_config(level, args.device)
+
+    rows = quantization_report(candidates, validation_set, args.device, args.warmup, args.iterations, args.max_drop,
+                               configs)
+    for row in rows:
+        row["sparsity"] = sparsity_levels.get(row["label"])
+    selected = select_model(rows)
+    sparse = select_sparse_setting(rows)
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump({"timestamp": time.time(), "metric": VALIDATION_METRIC, "max_drop": args.max_drop,
+                   "validation_images": len(validation_set), "selected": selected["label"],
+                   "selected_sparse": sparse["label"] if sparse else None, "models": rows}, f, indent=2)
+    print(f"Report written to: {args.report}")
+    print(f"Selected {selected['label']}: p50 {selected['p50_ms']:.2f} ms, "
+          f"Dice {selected['dice']:.4f} (drop {selected['accuracy_drop']:+.4f})")
+    if sparse:
+        print(f"Best sparsity setting: {sparse['label']} ({sparse['throughput_fps']:.1f} img/s, "
+              f"drop {sparse['accuracy_drop']:+.4f})")
+    elif sparsity_levels:
+        print("No sparsity setting meets the accuracy budget.")
+
+    if not args.no_register:
+        register_serving_model(selected)
+        if sparse:
+            publish_sparse_variant(sparse)
 
 
 if __name__ == "__main__":
-    optimize_model_with_nncf()
+    main()
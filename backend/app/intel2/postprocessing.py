@@ -0,0 +1,176 @@
+# File: backend/app/intel2/postprocessing.py
+
+import threading
+import numpy as np
+import cv2
+
+
+class ArgmaxPostprocessor:
+    """Allocation-free per-pixel argmax over (C, H, W) logits.
+
+    Used when ArgMax could not be folded into the model graph. Classes are
+    scanned one plane at a time into preallocated buffers, so no int64 label
+    map or full-size temporaries are created; ties resolve to the lowest
+    class index, matching np.argmax. The returned mask is a view of an
+    internal buffer and is overwritten by the next call.
+    """
+
+    def __init__(self):
+        self._shape = None
+
+    def _allocate(self, height, width):
+        self.best = np.empty((height, width), dtype=np.float32)
+        self.labels = np.empty((height, width), dtype=np.uint8)
+        self.greater = np.empty((height, width), dtype=bool)
+        self._shape = (height, width)
+
+    def __call__(self, logits, class_id=None):
+        """Return the uint8 class mask, or a 0/1 mask of `class_id` if given."""
+        if logits.ndim == 4:
+            logits = logits[0]
+        num_classes, height, width = logits.shape
+        if num_classes > 256:
+            raise ValueError("ArgmaxPostprocessor supports at most 256 classes.")
+        if self._shape != (height, width):
+            self._allocate(height, width)
+
+        np.copyto(self.best, logits[0], casting="same_kind")
+        self.labels.fill(0)
+        for c in range(1, num_classes):
+            np.greater(logits[c], self.best, out=self.greater)
+            np.copyto(self.best, logits[c], where=self.greater, casting="same_kind")
+            np.copyto(self.labels, c, where=self.greater)
+
+        if class_id is not None:
+            np.equal(self.labels, class_id, out=self.greater)
+            np.copyto(self.labels, self.greater, casting="unsafe")
+        return self.labels
+
+
+_local = threading.local()
+
+
+def _thread_postprocessor():
+    """Per-thread ArgmaxPostprocessor, since its buffers are not shareable."""
+    if not hasattr(_local, "postprocessor"):
+        _local.postprocessor = ArgmaxPostprocessor()
+    return _local.postprocessor
+
+
+def masks_from_output(output, class_id=None):
+    """Convert a batched model output into a list of uint8 masks, one per sample.
+
+    Outputs of models compiled with the "argmax" or "select_class" transforms
+    are already (N, H, W) integer masks and are only copied out of the request
+    buffer; float logits fall back to the NumPy path.
+    """
+    if np.issubdtype(output.dtype, np.integer):
+        masks = output if output.ndim == 3 else output.reshape((-1,) + output.shape[-2:])
+        return [mask.astype(np.uint8, copy=True) for mask in masks]
+
+    postprocessor = _thread_postprocessor()
+    return [postprocessor(sample, class_id).copy() for sample in output]
+
+
+def resize_mask(mask, shape):
+    """Resize a uint8 class mask to (H, W) `shape` with nearest-neighbour sampling (no copy if it matches)."""
+    if mask.shape == tuple(shape):
+        return mask
+    return cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+
+
+def mask_to_png(mask):
+    """Encode a class mask as a black and white PNG (foreground white)."""
+    ok, data = cv2.imencode(".png", np.not_equal(mask, 0).astype(np.uint8) * 255)
+    if not ok:
+        raise ValueError("Unable to encode the mask as PNG.")
+    return data.tobytes()
+
+
+# Defaults for the cleanup stage between inference and meshing
+CLEANUP_PARAMS = {
+    "min_area": 64,
+    "keep_top_k": 1,
+    "fill_holes": True,
+}
+
+
+def _select_components(labels, areas, min_area, keep_top_k, out=None):
+    """Map component labels to a 0/1 mask of the `keep_top_k` largest components of at least `min_area`."""
+    lut = np.zeros(len(areas) + 1, dtype=np.uint8)
+    order = np.argsort(areas)[::-1]
+    order = order[areas[order] >= min_area]
+    if keep_top_k is not None:
+        order = order[:keep_top_k]
+    lut[order + 1] = 1
+    return np.take(lut, labels, out=out)
+
+
+def _fill_holes_2d(mask):
+    """Fill background regions of a 0/1 mask that do not touch the image border."""
+    background = np.equal(mask, 0).view(np.uint8)
+    count, labels = cv2.connectedComponents(background, connectivity=4)
+    border = np.unique(np.concatenate((labels[0], labels[-1], labels[:, 0], labels[:, -1])))
+    is_hole = np.ones(count, dtype=np.uint8)
+    is_hole[0] = 0  # label 0 marks the foreground itself
+    is_hole[border] = 0
+    np.bitwise_or(mask, is_hole[labels], out=mask)
+    return mask
+
+
+def clean_mask(mask, min_area=0, keep_top_k=1, fill_holes=False, connectivity=8):
+    """Keep the largest connected foreground components of a 2D mask.
+
+    Any non-zero class is foreground. Components are found with OpenCV's
+    connectedComponentsWithStats, so areas come from its stats table instead of
+    a bincount over the full label image. `keep_top_k=None` keeps every
+    component of at least `min_area` pixels. Returns a 0/1 uint8 mask.
+    """
+    foreground = np.not_equal(mask, 0).view(np.uint8)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(foreground, connectivity=connectivity)
+    if count <= 1:
+        return np.zeros(mask.shape, dtype=np.uint8)
+
+    cleaned = _select_components(labels, stats[1:, cv2.CC_STAT_AREA], min_area, keep_top_k)
+    if fill_holes:
+        _fill_holes_2d(cleaned)
+    return cleaned
+
+
+def clean_stack(stack, out=None, **kwargs):
+    """Apply `clean_mask` slice by slice to an (N, H, W) stack, writing into `out` if given."""
+    if out is None:
+        out = np.empty(stack.shape, dtype=np.uint8)
+    for index in range(stack.shape[0]):
+        out[index] = clean_mask(stack[index], **kwargs)
+    return out
+
+
+def clean_volume(volume, min_area=0, keep_top_k=1, fill_holes=False, out=None):
+    """Keep the largest 3D connected components of an (N, H, W) volume.
+
+    Uses scipy.ndimage with 26-connectivity when available; otherwise falls
+    back to cleaning each slice independently with `clean_stack`. `out` may be
+    a preallocated (e.g. memory-mapped) uint8 volume to write into. The 3D
+    labelling is not out-of-core: ndimage.label holds a boolean copy of the
+    volume and an int32 label volume (5 bytes per voxel) in memory.
+    """
+    try:
+        from scipy import ndimage
+    except ImportError:
+        print("Warning: scipy not installed, cleaning volume slice by slice.")
+        return clean_stack(volume, out=out, min_area=min_area, keep_top_k=keep_top_k, fill_holes=fill_holes)
+
+    if out is None:
+        out = np.empty(volume.shape, dtype=np.uint8)
+    labels, count = ndimage.label(np.not_equal(volume, 0), structure=np.ones((3, 3, 3), dtype=bool))
+    if count == 0:
+        out[...] = 0
+        return out
+
+    areas = np.bincount(labels.ravel(), minlength=count + 1)[1:]
+    _select_components(labels, areas, min_area, keep_top_k, out=out)
+    del labels
+    if fill_holes:
+        out[...] = ndimage.binary_fill_holes(out)
+    return out
@@ -0,0 +1,74 @@
+# File: backend/app/intel2/series.py
+
+from collections import deque
+from intel2.inference import preprocess_array
+from intel2.inference_server import get_inference_server
+from utils.file_processing import series_slice_names, iter_series_slices
+from utils.volume_store import VolumeStore
+
+
+def segment_series(folder, spacing=(1.0, 1.0, 1.0), server=None, progress=None, store=None, name="mask"):
+    """
+    Segments a staged CT series slice by slice into a (slices, H, W) uint8 volume.
+    - The volume is the memory-mapped volume `name` of `store` (a VolumeStore),
+      so the masks never have to fit in the process's RSS.
+    - Slices are decoded and preprocessed one at a time and submitted to the
+      inference server, which batches them; at most one batch per infer request
+      is in flight, so peak memory does not grow with the number of slices.
+    - `spacing` is the (z, y, x) voxel size of the input slices; the returned
+      spacing is rescaled to the mask resolution of the server's model.
+    - `progress(done, total)` is called as slices complete.
+    """
+    server = server or get_inference_server()
+    total = len(series_slice_names(folder))
+    store = store or VolumeStore()
+    mask_height, mask_width = server.input_shape[2:]
+    volume = store.create(name, (total, mask_height, mask_width))
+    max_in_flight = server.max_batch_size * server.num_requests
+
+    in_flight = deque()
+    done = 0
+    slice_shape = None
+
+    def collect():
+        nonlocal done
+        index, future = in_flight.popleft()
+        volume[index] = future.result()
+        done += 1
+        if progress:
+            progress(done, total)
+
+    for index, image in enumerate(iter_series_slices(folder)):
+        if slice_shape is None:
+            slice_shape = image.shape
+        elif image.shape != slice_shape:
+            raise ValueError(f"Slice {index} has shape {image.shape}, expected {slice_shape}.")
+        in_flight.append((index, server.submit(preprocess_array(image, inplace=True, shape=server.input_shape))))
+        if len(in_flight) >= max_in_flight:
+            collect()
+    while in_flight:
+        collect()
+
+    volume.flush()
+
+    # Each mask pixel covers (input size / mask size) input pixels in-plane
+    z, y, x = spacing
+    voxel_spacing = (
+        float(z),
+        float(y) * slice_shape[0] / mask_height,
+        float(x) * slice_shape[1] / mask_width,
+    )
+    return volume, voxel_spacing
+
+
+def parse_spacing(value):
+    """Parse a "z,y,x" voxel spacing string (in mm) into a float tuple."""
+    if not value:
+        return (1.0, 1.0, 1.0)
+    try:
+        spacing = tuple(float(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid spacing {value!r}; expected 'z,y,x'.")
+    if len(spacing) != 3 or min(spacing) <= 0:
+        raise ValueError(f"Invalid spacing {value!r}; expected three positive values 'z,y,x'.")
+    return spacing
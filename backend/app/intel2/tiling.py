@@ -0,0 +1,112 @@
+# File: backend/app/intel2/tiling.py
+
+import os
+import numpy as np
+from intel2.compiled_models import get_compiled_model
+from utils.image_preprocessing import MODEL_INPUT_SHAPE, allocate_input_buffer, preprocess_into
+
+# Overlap between neighbouring tiles; predictions are cross-faded across it
+TILE_OVERLAP = int(os.environ.get("PROSTHETIC_TILE_OVERLAP", 64))
+TILE_BATCH_SIZE = int(os.environ.get("PROSTHETIC_TILE_BATCH_SIZE", 16))  # Tiles inferred per batch
+# "auto" mode tiles scans at least this many times larger than the model input in either dimension
+TILING_MIN_SCALE = float(os.environ.get("PROSTHETIC_TILING_MIN_SCALE", 1.5))
+
+# How a single scan is fitted to the model: resized to the input, tiled at
+# native resolution, or tiled only when large enough to lose detail on resize
+INFERENCE_MODES = ("resize", "tiled", "auto")
+INFERENCE_MODE = os.environ.get("PROSTHETIC_INFERENCE_MODE", "resize")
+
+
+def tile_origins(length, tile, overlap=TILE_OVERLAP):
+    """Start offsets of tiles covering `length` pixels, the last flush with the end."""
+    if length <= tile:
+        return [0]
+    stride = max(1, tile - overlap)
+    origins = list(range(0, length - tile, stride))
+    return origins + [length - tile]
+
+
+def blend_window(height, width, overlap=TILE_OVERLAP):
+    """(H, W) float32 weights ramping linearly up over `overlap` pixels from each edge.
+
+    Weights stay positive at the border, so pixels covered by a single tile
+    (e.g. at the image edge) keep that tile's prediction.
+    """
+    def ramp(length):
+        edge = min(overlap, length // 2)
+        weights = np.ones(length, dtype=np.float32)
+        if edge > 0:
+            rise = (np.arange(edge, dtype=np.float32) + 1.0) / (edge + 1.0)
+            weights[:edge] = rise
+            weights[length - edge:] = rise[::-1]
+        return weights
+
+    return np.outer(ramp(height), ramp(width))
+
+
+def resolve_mode(mode, image_shape, input_shape=MODEL_INPUT_SHAPE, min_scale=TILING_MIN_SCALE):
+    """Resolve `mode` to "resize" or "tiled" for an (H, W) scan and a model taking (N, C, H, W) `input_shape`."""
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode {mode!r}; expected one of {', '.join(INFERENCE_MODES)}.")
+    if mode != "auto":
+        return mode
+    height, width = input_shape[2:]
+    large = image_shape[0] >= height * min_scale or image_shape[1] >= width * min_scale
+    return "tiled" if large else "resize"
+
+
+def segment_tiled(image, model_path, device="CPU", config=None, transforms=(), input_shape=MODEL_INPUT_SHAPE,
+                  overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE):
+    """
+    Segments a grayscale scan at its native resolution with overlapping tiles.
+    - Tiles of the model's input size (`input_shape`) are preprocessed like
+      served inputs and inferred together, up to `batch_size` per batch.
+    - Each pixel keeps the class with the highest score weighted by
+      `blend_window` across the tiles covering it, so predictions near a
+      tile's edge give way to a neighbour that sees the pixel more centrally.
+      Only a running (best score, label) pair per pixel is kept, as in
+      ArgmaxPostprocessor, so memory grows by 5 bytes per scan pixel whatever
+      the number of classes. Scores are the model's SoftMax probabilities.
+    - Scans smaller than a tile are zero-padded (background) to the tile size.
+    Returns a uint8 class mask with the scan's shape.
+    """
+    tile_height, tile_width = input_shape[2:]
+    height, width = image.shape
+    padded = image
+    if height < tile_height or width < tile_width:
+        padded = np.zeros((max(height, tile_height), max(width, tile_width)), dtype=image.dtype)
+        padded[:height, :width] = image
+
+    origins = [
+        (y, x)
+        for y in tile_origins(padded.shape[0], tile_height, overlap)
+        for x in tile_origins(padded.shape[1], tile_width, overlap)
+    ]
+    compiled_model = get_compiled_model(model_path, device, config, tuple(transforms) + ("dynamic_batch",))
+    request = compiled_model.create_infer_request()
+    window = blend_window(tile_height, tile_width, overlap)
+    best = np.full(padded.shape, -np.inf, dtype=np.float32)
+    labels = np.zeros(padded.shape, dtype=np.uint8)
+    weighted = np.empty((tile_height, tile_width), dtype=np.float32)
+    greater = np.empty((tile_height, tile_width), dtype=bool)
+    scratch = np.empty((tile_height, tile_width), dtype=np.uint8)
+
+    for start in range(0, len(origins), batch_size):
+        chunk = origins[start:start + batch_size]
+        batch = allocate_input_buffer(len(chunk), input_shape)
+        for index, (y, x) in enumerate(chunk):
+            preprocess_into(padded[y:y + tile_height, x:x + tile_width], batch[index], scratch)
+        request.infer([batch])
+        output = request.get_output_tensor(0).data
+        if output.shape[1] > 256:
+            raise ValueError("Tiled inference supports at most 256 classes.")
+        for index, (y, x) in enumerate(chunk):
+            tile_best = best[y:y + tile_height, x:x + tile_width]
+            tile_labels = labels[y:y + tile_height, x:x + tile_width]
+            for c in range(output.shape[1]):
+                np.multiply(output[index, c], window, out=weighted)
+                np.greater(weighted, tile_best, out=greater)
+                np.copyto(tile_best, weighted, where=greater)
+                np.copyto(tile_labels, c, where=greater)
+
+    return labels[:height, :width].copy()
@@ -0,0 +1,121 @@
+# File: backend/app/intel2/validation.py
+
+import os
+import copy
+import numpy as np
+import cv2
+from intel2.calibration import CalibrationDataset, CALIBRATION_CACHE_DIR, DECODE_WORKERS, list_images
+from intel2.postprocessing import masks_from_output, resize_mask
+from utils.image_preprocessing import MODEL_INPUT_HEIGHT, MODEL_INPUT_SHAPE, MODEL_INPUT_WIDTH
+
+# Ground-truth masks are grayscale images with white foreground; JPEG noise stays below this
+MASK_THRESHOLD = 127
+
+# Metric optimized by accuracy-controlled quantization (higher is better)
+VALIDATION_METRIC = "dice"
+
+
+def read_mask(path, shape=(MODEL_INPUT_HEIGHT, MODEL_INPUT_WIDTH)):
+    """Read a ground-truth mask as a boolean foreground array of `shape` (H, W)."""
+    mask = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise ValueError(f"Error: Unable to read the ground truth file at {path}.")
+    mask = cv2.resize(mask, shape[::-1], interpolation=cv2.INTER_NEAREST)
+    return np.greater(mask, MASK_THRESHOLD)
+
+
+def overlap_scores(predicted, target):
+    """
+    Foreground overlap between a predicted class mask and a boolean target.
+    - Any non-zero class is foreground, as in meshing and cleanup.
+    - Returns IoU, Dice and pixel accuracy; two empty masks score 1.0.
+    """
+    predicted = np.not_equal(predicted, 0)
+    intersection = int(np.count_nonzero(predicted & target))
+    predicted_area = int(np.count_nonzero(predicted))
+    target_area = int(np.count_nonzero(target))
+    union = predicted_area + target_area - intersection
+    return {
+        "iou": intersection / union if union else 1.0,
+        "dice": 2.0 * intersection / (predicted_area + target_area) if union else 1.0,
+        "pixel_accuracy": float(np.count_nonzero(predicted == target)) / target.size,
+    }
+
+
+class ValidationSet:
+    """
+    Scans paired with ground-truth masks for measuring segmentation quality.
+    - Masks are matched to images by their path relative to the folder,
+      without extension, so `images/a/001.png` pairs with `masks/a/001.jpg`.
+    - Inputs use the calibration loader (parallel decoding, memmap cache and
+      the serving preprocessing) at `input_shape`; masks are held as booleans
+      at the full model resolution.
+    - Iterating yields (input_tensor, target_mask) pairs.
+    """
+
+    def __init__(self, images_dir, masks_dir, subset_size=None, cache_dir=CALIBRATION_CACHE_DIR,
+                 workers=DECODE_WORKERS, input_shape=MODEL_INPUT_SHAPE):
+        masks = {
+            os.path.splitext(os.path.relpath(path, masks_dir))[0]: path for path in list_images(masks_dir)
+        }
+        self.images_dir, self.subset_size, self.cache_dir, self.workers = images_dir, subset_size, cache_dir, workers
+        self.input_shape = tuple(input_shape)
+        self.inputs = CalibrationDataset(images_dir, subset_size, cache_dir, workers, input_shape)
+        keys = [os.path.splitext(os.path.relpath(path, images_dir))[0] for path in self.inputs.image_paths]
+        missing = [key for key in keys if key not in masks]
+        if missing:
+            raise ValueError(f"No ground truth mask in {masks_dir} for {len(missing)} images, e.g. {missing[0]}.")
+        self.mask_paths = [masks[key] for key in keys]
+        self.targets = np.stack([read_mask(path) for path in self.mask_paths])
+
+    def at_shape(self, input_shape):
+        """This set with its inputs preprocessed from the source images at `input_shape`, as that variant is served."""
+        if tuple(input_shape) == self.input_shape:
+            return self
+        resized = copy.copy(self)
+        resized.input_shape = tuple(input_shape)
+        resized.inputs = CalibrationDataset(self.images_dir, self.subset_size, self.cache_dir, self.workers, input_shape)
+        return resized
+
+    def __len__(self):
+        return len(self.mask_paths)
+
+    def __iter__(self):
+        return zip(self.inputs, self.targets)
+
+
+def input_of(item):
+    """Model input of a validation item, as NNCF's transform function."""
+    return item[0]
+
+
+def evaluate(compiled_model, items, input_shape=MODEL_INPUT_SHAPE):
+    """
+    Runs `compiled_model` over (input_tensor, target_mask) items.
+    - Accepts logit or fused-argmax outputs.
+    - For a model with a smaller `input_shape`, a ValidationSet is
+      re-preprocessed from its source images at that shape, as the variant is
+      served, and the masks are scored after upsampling back to the target
+      resolution.
+    - Returns the per-image mean of each overlap score plus the image count.
+    """
+    if isinstance(items, ValidationSet):
+        items = items.at_shape(input_shape)
+    request = compiled_model.create_infer_request()
+    scores = []
+    for input_tensor, target in items:
+        if input_tensor.shape[2:] != tuple(input_shape[2:]):
+            raise ValueError(f"Inputs of shape {input_tensor.shape} do not match the model input {input_shape}.")
+        request.infer([input_tensor])
+        predicted = masks_from_output(request.get_output_tensor(0).data)[0]
+        scores.append(overlap_scores(resize_mask(predicted, target.shape), target))
+    if not scores:
+        raise ValueError("The validation set is empty.")
+    summary = {name: float(np.mean([score[name] for score in scores])) for name in scores[0]}
+    summary["images"] = len(scores)
+    return summary
+
+
+def validation_score(compiled_model, items):
+    """Mean VALIDATION_METRIC of `compiled_model`, as NNCF's validation function."""
+    return evaluate(compiled_model, items)[VALIDATION_METRIC]
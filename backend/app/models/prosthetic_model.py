@@ -10,13 +10,13 @@ def preprocess_image(file):
     image = np.expand_dims(image, axis=(0, 1)).astype(np.float32)  # Add batch and channel dimensions
     return image
 
-def clean_segmentation(segmentation_mask):
+def clean_segmentation(segmentation_mask, min_area=0, keep_top_k=1, fill_holes=False):
     """Removes noise and keeps the largest connected component."""
-    from skimage import measure
+    from intel2.postprocessing import clean_mask, clean_volume
 
-    labels = measure.label(segmentation_mask, connectivity=2)
-    largest_label = labels == np.argmax(np.bincount(labels.flat)[1:]) + 1
-    return largest_label.astype(np.uint8)
+    if segmentation_mask.ndim == 3:
+        return clean_volume(segmentation_mask, min_area=min_area, keep_top_k=keep_top_k, fill_holes=fill_holes)
+    return clean_mask(segmentation_mask, min_area=min_area, keep_top_k=keep_top_k, fill_holes=fill_holes)
 
 def generate_prosthetic_design(file):
     return {"design": "Generated prosthetic design based on scan."}
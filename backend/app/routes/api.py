@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from routes.prosthetic_routes import process_ct_scan
+from routes.prosthetic_routes import process_ct_scan, requested_mode, requested_variant
 
 api_blueprint = Blueprint('api', __name__)
 
@@ -9,6 +9,9 @@ def process_scan():
         return jsonify({"error": "No file uploaded"}), 400
 
     file = request.files['file']
-    # Process CT scan and return segmentation result
-    result = process_ct_scan(file)
+    # Process CT scan with the model variant and inference mode asked for by the optional fields
+    try:
+        result = process_ct_scan(file, requested_variant(request.values), requested_mode(request.values))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify({"segmentation_result": result})
@@ -1,54 +1,357 @@
 # File: backend/app/prosthetic_routes.py
 
 import os
-from flask import Blueprint, request, jsonify, redirect, url_for, render_template
-from utils.file_processing import save_file
-from intel2.inference import run_inference
-from intel2.mesh_processing import process_mesh
-from intel2.optimization import optimize_model_with_nncf as optimize_model
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from flask import Blueprint, Response, request, jsonify, url_for, render_template, send_file
+from utils.file_processing import read_image_upload, is_series_upload, stage_series_upload
+from utils.jobs import job_manager
+from utils.result_cache import result_cache, STL_PREFIX
+from utils.volume_store import VolumeStore
+from intel2.inference import preprocess_array
+from intel2.inference_server import get_inference_server, get_preview_server
+from intel2.model_zoo import model_zoo
+from intel2.postprocessing import CLEANUP_PARAMS, clean_mask, clean_volume, mask_to_png, resize_mask
+from intel2.tiling import INFERENCE_MODE, INFERENCE_MODES, resolve_mode, segment_tiled
+from intel2.series import segment_series, parse_spacing
+from intel2.mesh_io import Mesh, SIDECAR_ENCODINGS
+from intel2.mesh_processing import (
+    MESH_PARAMS, MESH_MIMETYPES, extract_surface, process_mesh, stl_path_for, lod_paths_for, mesh_file_path, cleanup_stl_outputs,
+)
+from utils.image_preprocessing import MODEL_INPUT_HEIGHT, MODEL_INPUT_WIDTH
 
 
 prosthetic_blueprint = Blueprint('prosthetic', __name__, template_folder='../templates')
 
+# Mesh serving: content-addressed (cached_*) outputs never change, so clients may keep them for a year
+MESH_MAX_AGE = int(os.environ.get("PROSTHETIC_MESH_MAX_AGE", 365 * 24 * 3600))
+ETAG_CACHE_SIZE = 4096  # Memoized content hashes, keyed by path, size and mtime
+_etag_cache = OrderedDict()
+_etag_lock = threading.Lock()
+
+
+def file_etag(path):
+    """Strong ETag for a file: the sha256 of its content, memoized until the file changes."""
+    stat = os.stat(path)
+    cache_key = (path, stat.st_size, stat.st_mtime_ns)
+    with _etag_lock:
+        if cache_key in _etag_cache:
+            _etag_cache.move_to_end(cache_key)
+            return _etag_cache[cache_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    etag = digest.hexdigest()
+
+    with _etag_lock:
+        _etag_cache[cache_key] = etag
+        while len(_etag_cache) > ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+def requested_variant(values):
+    """
+    Model zoo variant for a request's optional `tier` and `latency_budget_ms` fields.
+    - Returns None (the default serving model) when neither is given.
+    - Raises ValueError for an unknown tier or an invalid budget.
+    """
+    tier = values.get("tier") or None
+    budget = values.get("latency_budget_ms") or None
+    if budget is not None:
+        try:
+            budget = float(budget)
+        except ValueError:
+            raise ValueError(f"Invalid latency_budget_ms {budget!r}; expected milliseconds.")
+    return model_zoo.select(tier, budget)
+
+
+def requested_mode(values):
+    """Inference mode for a request's optional `mode` field ("resize", "tiled" or "auto")."""
+    mode = values.get("mode") or INFERENCE_MODE
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode {mode!r}; expected one of {', '.join(INFERENCE_MODES)}.")
+    return mode
+
+
+def requested_preview(values):
+    """Whether a request asked for a quick preview mask (`preview=1`)."""
+    return str(values.get("preview", "")).lower() in ("1", "true", "yes", "on")
+
+
+def segment_scan(server, image, mode="resize"):
+    """
+    Segments a decoded scan with `server`'s model.
+    - "resize" returns the mask at the full model resolution whatever the variant.
+    - "tiled" returns it at the scan's own resolution (see intel2/tiling.py).
+    """
+    if mode == "tiled":
+        return segment_tiled(image, server.model_path, server.device, server.config, server.model_transforms,
+                             server.input_shape)
+    # The decoded image is owned by the caller, so preprocessing can reuse it
+    mask = server.infer(preprocess_array(image, inplace=True, shape=server.input_shape))
+    return resize_mask(mask, (MODEL_INPUT_HEIGHT, MODEL_INPUT_WIDTH))
+
+
+def segment_upload(file, variant=None, mode=INFERENCE_MODE):
+    """Decodes an uploaded scan in memory and returns its segmentation mask and the resolved mode."""
+    server = get_inference_server(variant)
+    image = read_image_upload(file)
+    mode = resolve_mode(mode, image.shape, server.input_shape)
+    return segment_scan(server, image, mode), mode
+
+
+def process_ct_scan(file, variant=None, mode=INFERENCE_MODE):
+    """Segments an uploaded CT scan and summarizes the predicted classes."""
+    segmentation_mask, mode = segment_upload(file, variant, mode)
+    classes, counts = np.unique(segmentation_mask, return_counts=True)
+    return {
+        "shape": list(segmentation_mask.shape),
+        "class_pixel_counts": {int(c): int(n) for c, n in zip(classes, counts)},
+        "model_variant": variant,
+        "inference_mode": mode,
+    }
+
+
+def run_prosthetic_pipeline(job, image, variant=None, mode=INFERENCE_MODE, preview=False):
+    """Background job: segmentation with the requested model variant, then meshing in the process pool.
+
+    With `preview`, a reduced-resolution mask is published on the job (see
+    /jobs/<job_id>/preview) before the full-resolution pass runs.
+    """
+    server = get_inference_server(variant)
+    mode = resolve_mode(mode, image.shape, server.input_shape)
+
+    # Hash the decoded image before preprocessing overwrites it
+    job.update("cache_lookup", 0.05)
+    pipeline_params = {"cleanup": CLEANUP_PARAMS, "mesh": MESH_PARAMS, "mode": mode}
+    cache_key = result_cache.make_key(image, server.model_id, server.device, pipeline_params)
+    cached = result_cache.get(cache_key)
+    if cached:
+        return {"stl_id": cached["stl_id"], "cached": True, "model_variant": variant, "inference_mode": mode,
+                **cached["info"]}
+
+    if preview:
+        job.update("preview", 0.07)
+        preview_server = get_preview_server()
+        preview_mask = preview_server.infer(preprocess_array(image, shape=preview_server.input_shape))
+        job.set_preview(mask_to_png(preview_mask))
+
+    job.update("inference", 0.1)
+    segmentation_mask = segment_scan(server, image, mode)
+
+    job.update("cleanup", 0.3)
+    segmentation_mask = clean_mask(segmentation_mask, **CLEANUP_PARAMS)
+
+    # Each job meshes into its own file, so jobs can mesh in parallel
+    job.update("meshing", 0.4)
+    mesh = job_manager.run_cpu(process_mesh, segmentation_mask, job.id)
+
+    job.update("caching", 0.95)
+    info = {"metrics": mesh["metrics"], "decimation": mesh["decimation"]}
+    extra_files = [path for path in mesh["files"] if path != mesh["stl_path"]]
+    cached = result_cache.put(
+        cache_key, segmentation_mask, mesh["stl_path"], move=True, extra_file_paths=extra_files, info=info
+    )
+    cleanup_stl_outputs()
+    return {"stl_id": cached["stl_id"], "cached": False, "model_variant": variant, "inference_mode": mode, **info}
+
+
+def run_series_pipeline(job, folder, spacing, variant=None):
+    """Background job: batched segmentation of a CT series into a volume, then meshing.
+
+    Intermediate volumes live in a job-scoped VolumeStore that is deleted,
+    together with the staged upload, when the job finishes.
+    """
+    job.on_finish(lambda: shutil.rmtree(folder, ignore_errors=True))
+    store = VolumeStore()
+    job.on_finish(store.cleanup)
+
+    job.update("inference", 0.05)
+    volume, voxel_spacing = segment_series(
+        folder, spacing, server=get_inference_server(variant), store=store,
+        progress=lambda done, total: job.update("inference", 0.05 + 0.45 * done / total),
+    )
+
+    job.update("cleanup", 0.5)
+    cleaned = clean_volume(volume, out=store.create("cleaned", volume.shape), **CLEANUP_PARAMS)
+    cleaned.flush()
+    slices = int(volume.shape[0])
+    del volume, cleaned
+    store.delete("mask")
+
+    # Mesh workers read and unpack only their slab of the bit-packed volume from disk instead of
+    # receiving a pickled copy; slabs are meshed on the shared pool, then decimated in one worker
+    job.update("meshing", 0.6)
+    cleaned_ref = store.pack("cleaned")
+    surface = Mesh(*extract_surface(cleaned_ref, MESH_PARAMS["level"], voxel_spacing, submit=job_manager.submit_cpu))
+    mesh = job_manager.run_cpu(process_mesh, surface, job.id)
+    cleanup_stl_outputs()
+    return {
+        "stl_id": os.path.splitext(os.path.basename(mesh["stl_path"]))[0],
+        "slices": slices,
+        "spacing": list(voxel_spacing),
+        "metrics": mesh["metrics"],
+        "decimation": mesh["decimation"],
+        "model_variant": variant,
+    }
+
+
 # Define routes
 @prosthetic_blueprint.route('/upload', methods=['POST'])
 def upload():
-    """Handles CT scan upload and prosthetic generation."""
-    if 'file' not in request.files:
+    """Accepts a CT scan or series and queues prosthetic generation as a background job.
+
+    A single image is segmented as one slice; a zip of slices or several
+    `file` parts are segmented as a volume with the optional `spacing`
+    form field ("z,y,x" in mm). The optional `tier` ("quality", "balanced"
+    or "fast") and `latency_budget_ms` fields route the scan to the best
+    matching model variant (see intel2/model_zoo.py). For a single image,
+    `mode` ("resize", "tiled" or "auto") selects tiled inference and
+    `preview=1` publishes a quick low-resolution mask first.
+    """
+    files = request.files.getlist('file')
+    if not files:
         return jsonify({"error": "No file uploaded"}), 400
 
-    file = request.files['file']
     try:
-        # Save the uploaded file
-        file_path = save_file(file, 'uploads')
+        variant = requested_variant(request.values)
+        mode = requested_mode(request.values)
+        if is_series_upload(files):
+            spacing = parse_spacing(request.form.get('spacing'))
+            job = job_manager.submit(run_series_pipeline, stage_series_upload(files), spacing, variant)
+        else:
+            # Decode while the request stream is open; the job owns the array from here
+            image = read_image_upload(files[0])
+            job = job_manager.submit(run_prosthetic_pipeline, image, variant, mode, requested_preview(request.values))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # Run inference
-        segmentation_mask = run_inference(file_path)
+    status_url = url_for('prosthetic.job_status', job_id=job.id)
+    response = jsonify({"job_id": job.id, "status_url": status_url, "model_variant": variant})
+    response.headers["Location"] = status_url
+    return response, 202
 
-        # Generate STL file
-        stl_file_path = process_mesh(segmentation_mask)
 
-        # Normalize the path for URL generation
-        stl_file_path = stl_file_path.replace("\\", "/")
+@prosthetic_blueprint.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Reports the status and progress of a prosthetic generation job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    status = job.to_dict()
+    if job.preview is not None:
+        status["preview_url"] = url_for('prosthetic.job_preview', job_id=job.id)
+    if job.status == "done":
+        status["result_url"] = url_for('prosthetic.result', job_id=job.id)
+    return jsonify(status)
 
-        return redirect(url_for('prosthetic.result', stl_file=stl_file_path))
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
+
+@prosthetic_blueprint.route('/jobs/<job_id>/preview', methods=['GET'])
+def job_preview(job_id):
+    """Serves a job's quick low-resolution mask as a PNG, once its preview pass has run."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job.preview is None:
+        return jsonify({"error": "Preview not available"}), 404
+    return Response(job.preview, mimetype="image/png")
+
+
+@prosthetic_blueprint.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Reports result cache hit/miss counters for monitoring."""
+    return jsonify(result_cache.stats())
 
 
 @prosthetic_blueprint.route('/result', methods=['GET'])
 def result():
     """Renders the STL file in the result page."""
-    stl_file = request.args.get('stl_file')
-    if not stl_file:
-        return jsonify({"error": "STL file parameter missing"}), 400
+    stl_id = request.args.get('id')
+    job_id = request.args.get('job_id')
+    if job_id:
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        if job.status != "done":
+            return jsonify(job.to_dict()), 409 if job.status == "failed" else 202
+        stl_id = job.result["stl_id"]
+    elif not stl_id and request.args.get('stl_file'):
+        # Legacy links pass the STL path; only its file name is trusted
+        stl_id = os.path.splitext(os.path.basename(request.args['stl_file']))[0]
+
+    if not stl_id:
+        return jsonify({"error": "STL id parameter missing"}), 400
 
-    stl_file_path = os.path.join("backend", "app", "static", "prosthetics", os.path.basename(stl_file))
+    try:
+        stl_file_path = stl_path_for(stl_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if not os.path.exists(stl_file_path):
         return jsonify({"error": "STL file not found"}), 404
 
-    stl_file_url = url_for('static', filename=f'prosthetics/{os.path.basename(stl_file)}', _external=True)
-    return render_template('result.html', stl_file_url=stl_file_url)
+    stl_file_url = url_for('prosthetic.mesh_file', filename=f'{stl_id}.stl', _external=True)
+    # Coarsest first, so the viewer can show a preview while finer levels download;
+    # the compact GLB files are preferred when they were generated
+    lod_paths = lod_paths_for(stl_id, ext=".glb") or lod_paths_for(stl_id)
+    lod_urls = [
+        url_for('prosthetic.mesh_file', filename=os.path.basename(path), _external=True)
+        for path in reversed(lod_paths)
+    ]
+    return render_template('result.html', stl_file_url=stl_file_url, lod_urls=lod_urls)
+
+
+@prosthetic_blueprint.route('/mesh/<filename>', methods=['GET'])
+def mesh_file(filename):
+    """Serves a generated mesh with content negotiation and HTTP caching.
+
+    - A precompressed sidecar is sent when the client accepts its encoding.
+    - The strong ETag is the hash of the bytes sent, so If-None-Match gives a
+      304 and If-Range/Range requests get 206 partial content.
+    - Content-addressed outputs are `immutable`; per-job outputs must be
+      revalidated, which costs a 304 once the hash is memoized.
+    - Files are streamed with the server's file wrapper (sendfile where
+      available), or handed to the proxy when USE_X_SENDFILE is enabled.
+    """
+    try:
+        path = mesh_file_path(filename)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not os.path.exists(path):
+        return jsonify({"error": "Mesh file not found"}), 404
+
+    served, content_encoding = path, None
+    for encoding, suffix in SIDECAR_ENCODINGS.items():
+        if request.accept_encodings[encoding] > 0 and os.path.exists(path + suffix):
+            served, content_encoding = path + suffix, encoding
+            break
+
+    try:
+        etag = file_etag(served)
+        response = send_file(
+            os.path.abspath(served), mimetype=MESH_MIMETYPES[os.path.splitext(filename)[1]],
+            conditional=True, etag=etag,
+        )
+    except FileNotFoundError:
+        # Removed by the retention policy between the checks and the send
+        return jsonify({"error": "Mesh file not found"}), 404
+
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    response.vary.add("Accept-Encoding")
+    if filename.startswith(STL_PREFIX):
+        response.cache_control.public = True
+        response.cache_control.max_age = MESH_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    else:
+        response.cache_control.no_cache = True
+    return response
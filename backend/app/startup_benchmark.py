@@ -0,0 +1,81 @@
+# File: backend/app/startup_benchmark.py
+# Usage (from backend/app): python startup_benchmark.py [--budget_ms 1500] [--runs 5] [--json results.json]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Import-time budget for `import app`, and libraries the web process must only load lazily
+STARTUP_BUDGET_MS = 2000
+LAZY_MODULES = ("nncf", "matplotlib", "open3d", "trimesh", "skimage", "scipy", "openvino", "DracoPy", "brotli")
+
+
+def measure_import(module="app"):
+    """Import `module` in a fresh interpreter under -X importtime.
+
+    Warmup is deferred, so only the import itself is measured. Returns
+    {"total_ms": ..., "modules": {name: (self_ms, cumulative_ms)}}.
+    """
+    env = dict(os.environ, PROSTHETIC_DEFER_WARMUP="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us) / 1000.0, int(cumulative_us) / 1000.0)
+    return {"total_ms": modules[module][1], "modules": modules}
+
+
+def top_level_package(name):
+    return name.split(".")[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and guard the import time of the Flask app.")
+    parser.add_argument("--module", type=str, default="app", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure (median is reported)")
+    parser.add_argument("--budget_ms", type=float, default=STARTUP_BUDGET_MS, help="Fail above this median import time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--json", type=str, default=None, help="Optional path to write the measurements as JSON")
+    args = parser.parse_args()
+
+    runs = [measure_import(args.module) for _ in range(args.runs)]
+    totals = [run["total_ms"] for run in runs]
+    median_ms = statistics.median(totals)
+    modules = runs[-1]["modules"]
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f} ms, max {max(totals):.1f} ms, budget {args.budget_ms:.0f} ms)")
+    print("Slowest imports (cumulative ms):")
+    for name, (self_ms, cumulative_ms) in sorted(modules.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"  {cumulative_ms:9.1f}  {self_ms:8.1f}  {name}")
+
+    loaded_lazy = sorted({top_level_package(name) for name in modules} & set(LAZY_MODULES))
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    if loaded_lazy:
+        failures.append(f"modules that must load lazily were imported: {', '.join(loaded_lazy)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"module": args.module, "runs_ms": totals, "median_ms": median_ms,
+                       "budget_ms": args.budget_ms, "eager_lazy_modules": loaded_lazy}, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
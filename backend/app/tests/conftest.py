@@ -0,0 +1,8 @@
+# File: backend/app/tests/conftest.py
+# Run from backend/app: python -m pytest tests
+
+import os
+import sys
+
+# The app imports its packages (intel2, utils, routes) relative to backend/app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
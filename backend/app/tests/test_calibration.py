@@ -0,0 +1,67 @@
+# File: backend/app/tests/test_calibration.py
+
+import os
+from collections import Counter
+import pytest
+from intel2.calibration import _cache_key, stratified_subset
+
+
+def _dataset(sizes, root="/data"):
+    """Sorted image paths with `sizes[folder]` slices in each folder."""
+    return sorted(
+        os.path.join(root, folder, f"{index:03d}.png") for folder, size in sizes.items() for index in range(size)
+    )
+
+
+def _per_folder(subset, root="/data"):
+    return Counter(os.path.dirname(os.path.relpath(path, root)) for path in subset)
+
+
+@pytest.mark.parametrize("subset_size", [1, 7, 10, 33, 99])
+def test_stratified_subset_has_exact_size_without_duplicates(subset_size):
+    paths = _dataset({"a": 50, "b": 31, "c": 19})
+    subset = stratified_subset(paths, subset_size, "/data")
+    assert len(subset) == subset_size
+    assert len(set(subset)) == subset_size
+
+
+def test_stratified_subset_keeps_everything_when_not_smaller():
+    paths = _dataset({"a": 3, "b": 2})
+    assert stratified_subset(paths, None, "/data") == paths
+    assert stratified_subset(paths, 5, "/data") == paths
+    assert stratified_subset(paths, 50, "/data") == paths
+
+
+def test_stratified_subset_quotas_are_proportional():
+    subset = stratified_subset(_dataset({"a": 60, "b": 30, "c": 10}), 10, "/data")
+    assert _per_folder(subset) == {"a": 6, "b": 3, "c": 1}
+
+
+def test_stratified_subset_uses_largest_remainder_rounding():
+    # Quotas 2.4, 1.2 and 0.4: flooring leaves one pick, which goes to the largest remainder
+    subset = stratified_subset(_dataset({"a": 6, "b": 3, "c": 1}), 4, "/data")
+    assert _per_folder(subset) == {"a": 2, "b": 1, "c": 1}
+
+
+def test_stratified_subset_spreads_picks_over_each_folder():
+    paths = _dataset({"a": 9})
+    assert stratified_subset(paths, 3, "/data") == [paths[0], paths[4], paths[8]]
+
+
+def test_cache_key_tracks_file_changes(tmp_path):
+    paths = []
+    for name in ("a.png", "b.png"):
+        path = tmp_path / name
+        path.write_bytes(b"image")
+        paths.append(str(path))
+    key = _cache_key(paths)
+    assert _cache_key(paths) == key
+
+    stat = os.stat(paths[1])
+    os.utime(paths[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    changed = _cache_key(paths)
+    assert changed != key
+
+    (tmp_path / "a.png").write_bytes(b"larger image")
+    assert _cache_key(paths) not in (key, changed)
+    assert _cache_key(paths[:1]) != _cache_key(paths)
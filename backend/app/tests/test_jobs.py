@@ -0,0 +1,69 @@
+# File: backend/app/tests/test_jobs.py
+
+import os
+import sys
+import threading
+from utils.jobs import JobManager, JobStore
+
+
+def _app_state():
+    """Runs in a meshing worker: whether the app module is loaded and warming up there."""
+    return "app" in sys.modules, any(thread.name == "warmup" for thread in threading.enumerate())
+
+
+def _import_app():
+    """Runs in a meshing worker: import the app with warmup enabled and report its state."""
+    os.environ.pop("PROSTHETIC_DEFER_WARMUP", None)
+    import app  # noqa: F401
+
+    return _app_state()
+
+
+def test_run_cpu_task_does_not_import_app(monkeypatch):
+    monkeypatch.setenv("PROSTHETIC_DEFER_WARMUP", "1")
+    import app  # noqa: F401
+
+    manager = JobManager(pipeline_workers=1, mesh_workers=1)
+    try:
+        assert manager.run_cpu(_app_state) == (False, False)
+    finally:
+        manager.shutdown()
+
+
+def test_spawned_worker_importing_app_skips_warmup():
+    # What a worker sees when the parent was started as `python app.py`
+    manager = JobManager(pipeline_workers=1, mesh_workers=1)
+    try:
+        assert manager.run_cpu(_import_app) == (True, False)
+    finally:
+        manager.shutdown()
+
+
+def test_submit_records_result_and_failure(tmp_path):
+    manager = JobManager(pipeline_workers=1, mesh_workers=1, store=JobStore(str(tmp_path)))
+    done = manager.submit(lambda job, value: value * 2, 21)
+    failed = manager.submit(lambda job: 1 / 0)
+    manager.shutdown()
+    assert (done.status, done.result) == ("done", 42)
+    assert failed.status == "failed" and failed.error
+
+
+def test_jobs_are_visible_to_other_workers(tmp_path):
+    store = JobStore(str(tmp_path))
+    manager = JobManager(pipeline_workers=1, mesh_workers=1, store=store)
+
+    def pipeline(job):
+        job.set_preview(b"png")
+        return {"stl_id": "abc"}
+
+    job = manager.submit(pipeline)
+    manager.shutdown()
+
+    # A second worker process has its own JobManager over the same folder
+    other = JobManager(pipeline_workers=1, mesh_workers=1, store=JobStore(str(tmp_path)))
+    seen = other.get(job.id)
+    other.shutdown()
+    assert seen.to_dict() == job.to_dict()
+    assert (seen.status, seen.result, seen.preview) == ("done", {"stl_id": "abc"}, b"png")
+    assert other.get("0" * 32) is None
+    assert other.get("../jobs") is None
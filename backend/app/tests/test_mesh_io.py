@@ -0,0 +1,91 @@
+# File: backend/app/tests/test_mesh_io.py
+
+import io
+import numpy as np
+import pytest
+from intel2.mesh_io import Mesh, read_stl, write_stl
+
+# Regular octahedron: six vertices, eight outward-facing triangles
+OCTAHEDRON = Mesh(
+    [[1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]],
+    [[0, 2, 4], [2, 1, 4], [1, 3, 4], [3, 0, 4], [2, 0, 5], [1, 2, 5], [3, 1, 5], [0, 3, 5]],
+)
+
+
+def _random_mesh(vertex_count=50, face_count=80, seed=0):
+    rng = np.random.RandomState(seed)
+    return Mesh(rng.uniform(-100, 100, size=(vertex_count, 3)), rng.randint(0, vertex_count, size=(face_count, 3)))
+
+
+@pytest.mark.parametrize("binary", [True, False])
+def test_stl_round_trip(tmp_path, binary):
+    mesh = _random_mesh()
+    path = str(tmp_path / "mesh.stl")
+    write_stl(mesh, path, binary=binary)
+    loaded = read_stl(path)
+
+    assert len(loaded) == len(mesh)
+    np.testing.assert_allclose(loaded.triangles, mesh.triangles, rtol=1e-6)
+
+
+def test_stl_write_to_file_object_and_chunks(tmp_path, monkeypatch):
+    import intel2.mesh_io as mesh_io
+
+    monkeypatch.setattr(mesh_io, "STL_WRITE_CHUNK", 7)
+    mesh = _random_mesh(face_count=30)
+    buffer = io.BytesIO()
+    write_stl(mesh, buffer)
+    assert len(buffer.getvalue()) == 84 + 50 * len(mesh)
+
+    path = tmp_path / "mesh.stl"
+    path.write_bytes(buffer.getvalue())
+    np.testing.assert_array_equal(read_stl(str(path)).triangles, mesh.triangles)
+
+
+def test_stl_normals_point_outwards(tmp_path):
+    path = str(tmp_path / "octahedron.stl")
+    write_stl(OCTAHEDRON, path)
+    records = np.fromfile(path, dtype=np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)),
+                                                ("attributes", "<u2")]), offset=84)
+    centers = records["vertices"].mean(axis=1)
+    assert np.all(np.einsum("ij,ij->i", records["normal"], centers) > 0)
+    np.testing.assert_allclose(np.linalg.norm(records["normal"], axis=1), 1.0, rtol=1e-6)
+
+
+def test_read_stl_rejects_other_files(tmp_path):
+    path = tmp_path / "mesh.stl"
+    path.write_bytes(b"not a mesh")
+    with pytest.raises(ValueError):
+        read_stl(str(path))
+
+
+def _smooth_reference(mesh, iterations):
+    """Per-vertex loop version of Laplacian smoothing with each vertex counted once."""
+    neighbours = [set() for _ in mesh.vertices]
+    for face in mesh.faces:
+        for a in face:
+            neighbours[a].update(int(b) for b in face if b != a)
+    vertices = mesh.vertices.astype(np.float64)
+    for _ in range(iterations):
+        vertices = np.array([
+            (vertices[i] + sum(vertices[j] for j in neighbours[i])) / (len(neighbours[i]) + 1)
+            for i in range(len(vertices))
+        ])
+    return vertices
+
+
+@pytest.mark.parametrize("iterations", [0, 1, 3])
+def test_smooth_simple_matches_reference(iterations):
+    mesh = _random_mesh()  # Includes degenerate faces that repeat a vertex
+    smoothed = mesh.smooth_simple(iterations)
+
+    assert smoothed.faces is mesh.faces
+    assert smoothed.vertices.dtype == np.float32
+    np.testing.assert_allclose(smoothed.vertices, _smooth_reference(mesh, iterations), rtol=1e-5, atol=1e-4)
+
+
+def test_smooth_simple_shrinks_symmetric_mesh_about_its_centre():
+    smoothed = OCTAHEDRON.smooth_simple(1)
+    # Each vertex averages itself with its four neighbours: 1 / 5 of the original radius remains
+    np.testing.assert_allclose(np.linalg.norm(smoothed.vertices, axis=1), 0.2, rtol=1e-6)
+    np.testing.assert_allclose(smoothed.vertices.mean(axis=0), 0.0, atol=1e-7)
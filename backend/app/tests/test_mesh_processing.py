@@ -0,0 +1,96 @@
+# File: backend/app/tests/test_mesh_processing.py
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from intel2.mesh_processing import extract_surface
+from utils.volume_store import VolumeRef, VolumeStore
+
+pytest.importorskip("skimage")
+ndimage = pytest.importorskip("scipy.ndimage")
+
+
+def _random_volume(shape, seed=0):
+    """Random blobs (a thresholded smoothed noise field) with an empty border, so every surface is closed."""
+    field = ndimage.gaussian_filter(np.random.RandomState(seed).rand(*shape), 2.0)
+    volume = np.zeros(shape, dtype=np.uint8)
+    volume[1:-1, 1:-1, 1:-1] = (field > field.mean())[1:-1, 1:-1, 1:-1]
+    return volume
+
+
+def _signed_volume(vertices, faces):
+    triangles = vertices[faces].astype(np.float64)
+    return float(np.einsum("ij,ij->i", triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])).sum() / 6.0)
+
+
+def _edge_use_counts(faces):
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    _, counts = np.unique(edges, axis=0, return_counts=True)
+    return counts
+
+
+@pytest.mark.parametrize("chunk_slices", [7, 16, 64])
+def test_chunked_marching_cubes_matches_single_pass(chunk_slices):
+    volume = _random_volume((150, 30, 30))
+    spacing = (2.0, 0.5, 0.75)
+    vertices, faces = extract_surface(volume, 0.5, spacing)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        chunked_vertices, chunked_faces = extract_surface(volume, 0.5, spacing, chunk_slices, submit=pool.submit)
+
+    assert len(chunked_vertices) == len(vertices)
+    assert len(chunked_faces) == len(faces)
+    assert _signed_volume(chunked_vertices, chunked_faces) == pytest.approx(_signed_volume(vertices, faces), rel=1e-6)
+    # Watertight: every edge is shared by exactly two faces, so the seams are welded
+    assert np.all(_edge_use_counts(chunked_faces) == 2)
+    np.testing.assert_allclose(np.unique(chunked_vertices, axis=0), np.unique(vertices, axis=0), atol=1e-5)
+
+
+def test_chunked_marching_cubes_without_surface_raises():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        with pytest.raises(ValueError):
+            extract_surface(np.zeros((40, 8, 8), dtype=np.uint8), 0.5, chunk_slices=8, submit=pool.submit)
+
+
+def test_packed_volume_is_meshed_slab_by_slab(tmp_path, monkeypatch):
+    volume = _random_volume((60, 20, 21))
+    vertices, faces = extract_surface(volume, 0.5)
+    store = VolumeStore(str(tmp_path))
+    store.create("mask", volume.shape)[...] = volume
+    ref = store.pack("mask")
+    unpacked = []
+    read_slices = VolumeRef.read_slices
+    monkeypatch.setattr(VolumeRef, "open", lambda self: pytest.fail("the packed volume was unpacked in full"))
+    monkeypatch.setattr(VolumeRef, "read_slices",
+                        lambda self, start, stop: unpacked.append(stop - start) or read_slices(self, start, stop))
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for submit in (None, pool.submit):
+            unpacked.clear()
+            packed_vertices, packed_faces = extract_surface(ref, 0.5, chunk_slices=16, submit=submit)
+            assert max(unpacked) == 17
+            assert len(packed_faces) == len(faces)
+            np.testing.assert_allclose(np.unique(packed_vertices, axis=0), np.unique(vertices, axis=0), atol=1e-5)
+
+
+@pytest.mark.parametrize("chunk_slices", [None, 7, 64])
+def test_foreground_touching_the_borders_is_closed(tmp_path, chunk_slices):
+    volume = np.zeros((40, 40, 40), dtype=np.uint8)
+    volume[:, 5:35, 5:35] = 1  # spans every slice
+    volume[10:20, :, 30:] = 1  # touches the image border in y and x
+    store = VolumeStore(str(tmp_path))
+    store.create("mask", volume.shape)[...] = volume
+    sources = [volume, store.pack("mask")] if chunk_slices else [volume]
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for source in sources:
+            submit = pool.submit if chunk_slices else None
+            vertices, faces = extract_surface(source, 0.5, chunk_slices=chunk_slices or 64, submit=submit)
+            assert np.all(_edge_use_counts(faces) == 2)
+            assert vertices.min() == pytest.approx(-0.5)
+            assert vertices.max() == pytest.approx(39.5)
+
+
+def test_single_mask_is_closed():
+    mask = np.ones((12, 16), dtype=np.uint8)
+    _, faces = extract_surface(mask, 0.5)
+    assert np.all(_edge_use_counts(faces) == 2)
@@ -0,0 +1,95 @@
+# File: backend/app/tests/test_postprocessing.py
+
+import numpy as np
+import pytest
+from intel2.postprocessing import clean_mask, clean_stack, clean_volume
+
+measure = pytest.importorskip("skimage.measure")
+ndimage = pytest.importorskip("scipy.ndimage")
+
+
+def _baseline_clean_segmentation(segmentation_mask):
+    """The skimage cleanup clean_mask replaced (models/prosthetic_model.py before the cleanup engine)."""
+    labels = measure.label(segmentation_mask, connectivity=2)
+    largest_label = labels == np.argmax(np.bincount(labels.flat)[1:]) + 1
+    return largest_label.astype(np.uint8)
+
+
+def _reference_clean(mask, min_area=0, keep_top_k=1, fill_holes=False):
+    """skimage/scipy reference: full connectivity, rank by area, then fill enclosed background."""
+    labels = measure.label(np.not_equal(mask, 0), connectivity=mask.ndim)
+    areas = np.bincount(labels.ravel(), minlength=2)[1:]
+    ranked = [label + 1 for label in np.argsort(-areas, kind="stable") if areas[label] >= min_area]
+    if keep_top_k is not None:
+        ranked = ranked[:keep_top_k]
+    cleaned = np.isin(labels, ranked)
+    if fill_holes:
+        cleaned = ndimage.binary_fill_holes(cleaned)
+    return cleaned.astype(np.uint8)
+
+
+def _synthetic_mask():
+    """Components of distinct areas (116, 48, 18, 1) with mixed class ids, a hole and a diagonal-only joint."""
+    mask = np.zeros((40, 50), dtype=np.uint8)
+    mask[2:12, 2:14] = 2
+    mask[5:7, 6:8] = 0  # a hole in the largest component
+    mask[20:26, 30:38] = 5
+    mask[30:33, 5:8] = 1
+    mask[33:36, 8:11] = 1  # touches the square above only at a corner
+    mask[38, 48] = 3
+    return mask
+
+
+def _random_volume(shape, seed=0, percentile=60):
+    """Random blobs covering about (100 - percentile)% of the array."""
+    field = ndimage.gaussian_filter(np.random.RandomState(seed).rand(*shape), 1.0)
+    return (field > np.percentile(field, percentile)).astype(np.uint8)
+
+
+def test_clean_mask_matches_the_skimage_baseline():
+    mask = _synthetic_mask()
+    np.testing.assert_array_equal(clean_mask(mask), _baseline_clean_segmentation(mask))
+
+
+@pytest.mark.parametrize("keep_top_k", [1, 2, 3, None])
+@pytest.mark.parametrize("min_area", [0, 2, 20, 200])
+@pytest.mark.parametrize("fill_holes", [False, True])
+def test_clean_mask_matches_skimage_reference(keep_top_k, min_area, fill_holes):
+    mask = _synthetic_mask()
+    expected = _reference_clean(mask, min_area, keep_top_k, fill_holes)
+    np.testing.assert_array_equal(clean_mask(mask, min_area, keep_top_k, fill_holes), expected)
+
+
+@pytest.mark.parametrize("min_area", [0, 5, 40])
+@pytest.mark.parametrize("fill_holes", [False, True])
+def test_clean_mask_on_random_components(min_area, fill_holes):
+    # Many equal-sized components, so keep every one of at least `min_area` (ranking ties are irrelevant)
+    for seed in range(3):
+        mask = _random_volume((64, 64), seed)
+        expected = _reference_clean(mask, min_area, None, fill_holes)
+        np.testing.assert_array_equal(clean_mask(mask, min_area, None, fill_holes), expected)
+
+
+def test_clean_mask_of_empty_mask_is_empty():
+    assert not clean_mask(np.zeros((8, 8), dtype=np.uint8)).any()
+
+
+def test_clean_stack_cleans_each_slice():
+    stack = np.stack([_random_volume((32, 32), seed) for seed in range(4)])
+    expected = np.stack([_reference_clean(mask, 3, 2, True) for mask in stack])
+    np.testing.assert_array_equal(clean_stack(stack, min_area=3, keep_top_k=2, fill_holes=True), expected)
+
+
+@pytest.mark.parametrize("keep_top_k, min_area, fill_holes", [(1, 0, False), (1, 0, True), (None, 30, False)])
+def test_clean_volume_matches_skimage_reference(keep_top_k, min_area, fill_holes):
+    volume = _random_volume((16, 24, 24), percentile=80)
+    # A hollow cube as the largest component, so hole filling has an enclosed cavity to fill
+    volume[1:15, 1:15, 1:15] = 0
+    volume[2:14, 2:14, 2:14] = 1
+    volume[5:10, 5:10, 5:10] = 0
+    expected = _reference_clean(volume, min_area, keep_top_k, fill_holes)
+    assert expected[7, 7, 7] == fill_holes  # the reference keeps the cube and fills its cavity
+    out = np.empty(volume.shape, dtype=np.uint8)
+    result = clean_volume(volume, min_area, keep_top_k, fill_holes, out=out)
+    assert result is out
+    np.testing.assert_array_equal(result, expected)
@@ -0,0 +1,113 @@
+# File: backend/app/tests/test_result_cache.py
+
+import os
+import time
+import numpy as np
+import pytest
+from utils.result_cache import ResultCache
+
+MESH_PARAMS = {"level": 0.5, "lod_ratios": [1.0, 0.25]}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "results"), str(tmp_path / "prosthetics"))
+
+
+def _outputs(tmp_path, name, size=100):
+    """A generated STL and one LOD file named after it, with `size` bytes each."""
+    folder = tmp_path / "outputs"
+    folder.mkdir(exist_ok=True)
+    paths = [str(folder / f"{name}.stl"), str(folder / f"{name}_lod1.stl")]
+    for path in paths:
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+    return paths
+
+
+def _put(cache, tmp_path, key, size=100):
+    stl_path, lod_path = _outputs(tmp_path, key[:8], size)
+    return cache.put(key, np.zeros((4, 5), dtype=np.uint8), stl_path, extra_file_paths=[lod_path])
+
+
+def _set_age(cache, key, seconds):
+    """Make every file of `key` look last used `seconds` ago."""
+    when = time.time() - seconds
+    for path in cache._paths(key, cache._output_files()):
+        os.utime(path, (when, when))
+
+
+def test_put_then_get_round_trip(cache, tmp_path):
+    image = np.arange(20, dtype=np.uint8).reshape(4, 5)
+    key = cache.make_key(image, "model.xml@abc", "CPU", MESH_PARAMS)
+    assert cache.get(key) is None
+
+    mask = (image % 3).astype(np.uint8)
+    stl_path, lod_path = _outputs(tmp_path, "job")
+    cache.put(key, mask, stl_path, extra_file_paths=[lod_path], info={"metrics": {"volume": 1.5}})
+
+    entry = cache.get(key)
+    assert entry["stl_id"] == cache.stl_id(key)
+    assert entry["info"] == {"metrics": {"volume": 1.5}}
+    np.testing.assert_array_equal(cache.load_mask(key), mask)
+    with open(entry["stl_path"], "rb") as cached, open(stl_path, "rb") as original:
+        assert cached.read() == original.read()
+    assert os.path.exists(cache._stl_path(key, "_lod1.stl"))
+
+
+def test_put_rejects_files_not_named_after_the_stl(cache, tmp_path):
+    stl_path, _ = _outputs(tmp_path, "job")
+    other = _outputs(tmp_path, "other")[0]
+    with pytest.raises(ValueError):
+        cache.put("a" * 64, np.zeros((2, 2), dtype=np.uint8), stl_path, extra_file_paths=[other])
+
+
+def test_key_covers_image_model_device_and_mesh_params():
+    image = np.arange(20, dtype=np.uint8).reshape(4, 5)
+    key = ResultCache.make_key(image, "model.xml@abc", "CPU", MESH_PARAMS)
+    assert ResultCache.make_key(image.copy(), "model.xml@abc", "CPU", dict(MESH_PARAMS)) == key
+
+    changed = image.copy()
+    changed[0, 0] += 1
+    variants = [
+        ResultCache.make_key(changed, "model.xml@abc", "CPU", MESH_PARAMS),
+        ResultCache.make_key(image.reshape(5, 4), "model.xml@abc", "CPU", MESH_PARAMS),
+        ResultCache.make_key(image, "model.xml@def", "CPU", MESH_PARAMS),
+        ResultCache.make_key(image, "model.xml@abc|argmax", "CPU", MESH_PARAMS),
+        ResultCache.make_key(image, "model.xml@abc", "GPU", MESH_PARAMS),
+        ResultCache.make_key(image, "model.xml@abc", "CPU", {**MESH_PARAMS, "level": 0.4}),
+        ResultCache.make_key(image, "model.xml@abc", "CPU", {**MESH_PARAMS, "lod_ratios": [1.0]}),
+    ]
+    assert len(set(variants + [key])) == len(variants) + 1
+
+
+def test_least_recently_used_entry_is_evicted(cache, tmp_path):
+    first, second, third = ("1" * 64, "2" * 64, "3" * 64)
+    _put(cache, tmp_path, first, size=1000)
+    _put(cache, tmp_path, second, size=1000)
+    entry_size = cache.stats()["size_mb"] * 1024 * 1024 / 2
+    # Room for two entries but not three
+    cache.max_size_bytes = int(entry_size * 2.5)
+
+    _set_age(cache, first, 200)
+    _set_age(cache, second, 100)
+    assert cache.get(first) is not None  # now the most recently used
+
+    _put(cache, tmp_path, third, size=1000)
+    assert cache.get(second) is None
+    assert cache.get(first) is not None and cache.get(third) is not None
+    assert not any(name.startswith(cache.stl_id(second)) for name in os.listdir(cache.stl_folder))
+    assert not os.path.exists(cache._mask_path(second))
+
+
+def test_stats_count_hits_and_misses(cache, tmp_path):
+    key = "4" * 64
+    assert cache.get(key) is None
+    _put(cache, tmp_path, key)
+    cache.get(key)
+    cache.get(key)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+    assert stats["size_mb"] > 0
@@ -0,0 +1,104 @@
+# File: backend/app/tests/test_routes.py
+
+import gzip
+import hashlib
+import pytest
+from flask import Flask
+from intel2 import mesh_processing
+from routes import prosthetic_routes
+
+CACHED_ID = "cached_" + "a" * 64
+STL_BYTES = bytes(range(256)) * 8
+
+
+@pytest.fixture
+def stl_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(prosthetic_routes, "mesh_file_path",
+                        lambda filename: mesh_processing.mesh_file_path(filename, str(tmp_path)))
+    for stl_id in ("job", CACHED_ID):
+        with open(tmp_path / f"{stl_id}.stl", "wb") as f:
+            f.write(STL_BYTES)
+    return tmp_path
+
+
+@pytest.fixture
+def client(stl_dir):
+    app = Flask(__name__)
+    app.register_blueprint(prosthetic_routes.prosthetic_blueprint, url_prefix="/prosthetic")
+    return app.test_client()
+
+
+def test_mesh_is_served_with_a_strong_content_etag(client):
+    response = client.get("/prosthetic/mesh/job.stl")
+    assert response.status_code == 200
+    assert response.data == STL_BYTES
+    # Strong (not weak) and derived from the content
+    assert response.get_etag() == (hashlib.sha256(STL_BYTES).hexdigest(), False)
+
+
+def test_if_none_match_gives_not_modified(client):
+    etag = client.get("/prosthetic/mesh/job.stl").headers["ETag"]
+    response = client.get("/prosthetic/mesh/job.stl", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    changed = client.get("/prosthetic/mesh/job.stl", headers={"If-None-Match": '"stale"'})
+    assert changed.status_code == 200
+
+
+def test_range_request_gives_partial_content(client):
+    response = client.get("/prosthetic/mesh/job.stl", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.data == STL_BYTES[100:200]
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(STL_BYTES)}"
+    assert response.headers["Accept-Ranges"] == "bytes"
+
+    etag = response.headers["ETag"]
+    matching = client.get("/prosthetic/mesh/job.stl", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert matching.status_code == 206
+    stale = client.get("/prosthetic/mesh/job.stl", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200 and stale.data == STL_BYTES
+
+
+def test_precompressed_sidecar_follows_accept_encoding(client, stl_dir):
+    compressed = gzip.compress(STL_BYTES)
+    with open(stl_dir / "job.stl.gz", "wb") as f:
+        f.write(compressed)
+
+    response = client.get("/prosthetic/mesh/job.stl", headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.data == compressed
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+    identity = client.get("/prosthetic/mesh/job.stl", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in identity.headers
+    assert identity.data == STL_BYTES
+    # The ETag hashes the bytes sent, so the two representations never share one
+    assert identity.headers["ETag"] != response.headers["ETag"]
+
+
+def test_brotli_sidecar_is_preferred_when_accepted(client, stl_dir):
+    for suffix in (".br", ".gz"):
+        with open(stl_dir / f"job.stl{suffix}", "wb") as f:
+            f.write(suffix.encode())
+    response = client.get("/prosthetic/mesh/job.stl", headers={"Accept-Encoding": "gzip, br"})
+    assert (response.headers["Content-Encoding"], response.data) == ("br", b".br")
+    response = client.get("/prosthetic/mesh/job.stl", headers={"Accept-Encoding": "gzip"})
+    assert (response.headers["Content-Encoding"], response.data) == ("gzip", b".gz")
+
+
+def test_cached_outputs_are_immutable_and_job_outputs_revalidated(client):
+    cached = client.get(f"/prosthetic/mesh/{CACHED_ID}.stl")
+    assert cached.cache_control.immutable
+    assert cached.cache_control.public
+    assert cached.cache_control.max_age == prosthetic_routes.MESH_MAX_AGE
+    assert not cached.cache_control.no_cache
+
+    job = client.get("/prosthetic/mesh/job.stl")
+    assert job.cache_control.no_cache
+    assert not job.cache_control.immutable
+
+
+@pytest.mark.parametrize("filename, status", [("missing.stl", 404), ("job.exe", 400), ("..job.stl", 400)])
+def test_unknown_or_unsafe_mesh_names_are_rejected(client, filename, status):
+    assert client.get(f"/prosthetic/mesh/{filename}").status_code == status
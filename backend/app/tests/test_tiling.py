@@ -0,0 +1,78 @@
+# File: backend/app/tests/test_tiling.py
+
+import numpy as np
+import pytest
+import intel2.tiling as tiling
+from intel2.tiling import resolve_mode, segment_tiled, tile_origins
+from utils.image_preprocessing import MODEL_INPUT_HEIGHT, MODEL_INPUT_SHAPE, MODEL_INPUT_WIDTH, THRESHOLD
+
+
+class _Tensor:
+    def __init__(self, data):
+        self.data = data
+
+
+class _PointwiseModel:
+    """Stands in for a compiled model and its infer request: per-pixel class scores from the first channel."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def create_infer_request(self):
+        return self
+
+    def infer(self, inputs):
+        x = inputs[0][:, 0]
+        self.batch_sizes.append(len(x))
+        self._output = np.stack([1.0 - x, x, np.full_like(x, 0.25)], axis=1)
+
+    def get_output_tensor(self, index):
+        return _Tensor(self._output)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = _PointwiseModel()
+
+    def get_compiled_model(model_path, device="CPU", config=None, transforms=()):
+        assert "dynamic_batch" in transforms
+        return fake
+
+    monkeypatch.setattr(tiling, "get_compiled_model", get_compiled_model)
+    return fake
+
+
+@pytest.mark.parametrize("shape", [
+    (100, 120),  # Smaller than a tile
+    (MODEL_INPUT_HEIGHT, MODEL_INPUT_WIDTH),  # Exactly one tile
+    (MODEL_INPUT_HEIGHT + 1, MODEL_INPUT_WIDTH + 1),  # One pixel over in both directions
+    (MODEL_INPUT_HEIGHT - 1, 3 * MODEL_INPUT_WIDTH + 7),  # Wide
+])
+def test_segment_tiled_matches_whole_image(model, shape):
+    image = np.random.RandomState(0).randint(0, 2 * THRESHOLD, size=shape).astype(np.uint8)
+    mask = segment_tiled(image, "model.xml", batch_size=4)
+
+    assert mask.shape == shape and mask.dtype == np.uint8
+    np.testing.assert_array_equal(mask, (image > THRESHOLD).astype(np.uint8))
+    assert max(model.batch_sizes) <= 4
+
+
+def test_tile_origins_cover_length_with_overlap():
+    assert tile_origins(300, 368) == [0]
+    assert tile_origins(368, 368) == [0]
+    origins = tile_origins(1000, 368, overlap=64)
+    assert origins == [0, 304, 608, 632]
+    assert all(b - a <= 368 - 64 for a, b in zip(origins, origins[1:]))
+    assert origins[-1] + 368 == 1000
+
+
+def test_resolve_mode():
+    large, small = (2 * MODEL_INPUT_HEIGHT, MODEL_INPUT_WIDTH), (MODEL_INPUT_HEIGHT, MODEL_INPUT_WIDTH)
+    assert resolve_mode("resize", large) == "resize"
+    assert resolve_mode("tiled", small) == "tiled"
+    assert resolve_mode("auto", large) == "tiled"
+    assert resolve_mode("auto", small) == "resize"
+    # A reduced-resolution variant tiles scans that the full-size model would not
+    assert resolve_mode("auto", small, (1, 3, 192, 240)) == "tiled"
+    with pytest.raises(ValueError):
+        resolve_mode("sliding", small, MODEL_INPUT_SHAPE)
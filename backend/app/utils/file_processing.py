@@ -1,18 +1,152 @@
 import os
+import shutil
+import tempfile
 import uuid
+import zipfile
+import numpy as np
+import cv2
 
 # Constants
 UPLOAD_FOLDER = "uploads"
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "stl"}
 MAX_FILE_SIZE_MB = 10  # Maximum file size in MB
+SPILL_THRESHOLD_MB = 4  # Uploads above this size are decoded from a temp file
+SLICE_EXTENSIONS = {"png", "jpg", "jpeg"}  # Image slices accepted in a CT series
+MAX_SERIES_SIZE_MB = 512  # Maximum size of a CT series (zip contents or all files)
+MAX_SERIES_SLICES = 2048
 
 # Ensure the upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 
-def allowed_file(filename):
+def allowed_file(filename, allowed_extensions=ALLOWED_EXTENSIONS):
     """Check if the file has an allowed extension."""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
+
+
+def validate_file(file, allowed_extensions=ALLOWED_EXTENSIONS, max_size_mb=MAX_FILE_SIZE_MB):
+    """
+    Validates the uploaded file's extension and size.
+    - Returns the file size in bytes and leaves the stream at the start.
+    """
+    # Validate file extension
+    if not allowed_file(file.filename, allowed_extensions):
+        raise ValueError(f"Invalid file type. Allowed extensions are: {', '.join(sorted(allowed_extensions))}")
+
+    # Validate file size
+    file.seek(0, os.SEEK_END)  # Move to the end of the file to get its size
+    file_size = file.tell()
+    if file_size > max_size_mb * 1024 * 1024:
+        raise ValueError(f"File size exceeds the maximum limit of {max_size_mb} MB.")
+    file.seek(0)  # Reset file pointer for reading
+    return file_size
+
+
+def read_image_upload(file, spill_threshold_mb=SPILL_THRESHOLD_MB):
+    """
+    Decodes an uploaded image into a grayscale uint8 array without saving it.
+    - Small uploads are decoded in memory from the request stream.
+    - Uploads above `spill_threshold_mb` are spooled to a temp file first.
+    """
+    file_size = validate_file(file)
+
+    if file_size <= spill_threshold_mb * 1024 * 1024:
+        image = cv2.imdecode(np.frombuffer(file.read(), np.uint8), cv2.IMREAD_GRAYSCALE)
+    else:
+        suffix = os.path.splitext(file.filename)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            shutil.copyfileobj(getattr(file, "stream", file), tmp)
+        try:
+            image = cv2.imread(tmp.name, cv2.IMREAD_GRAYSCALE)
+        finally:
+            os.remove(tmp.name)
+
+    if image is None:
+        raise ValueError(f"Error: Unable to decode the uploaded image {file.filename}.")
+    return image
+
+
+def is_series_upload(files):
+    """Check whether the uploaded files form a CT series (a zip or several slices)."""
+    return len(files) > 1 or (len(files) == 1 and allowed_file(files[0].filename, {"zip"}))
+
+
+def stage_series_upload(files):
+    """
+    Stages a CT series upload in a private temp folder for background processing.
+    - Accepts a single zip of slices or several slice images.
+    - Returns the folder; the caller removes it once the series is processed.
+    """
+    if len(files) > MAX_SERIES_SLICES:
+        raise ValueError(f"A series may contain at most {MAX_SERIES_SLICES} slices.")
+
+    folder = tempfile.mkdtemp(prefix="series_")
+    try:
+        total_size = 0
+        for index, file in enumerate(files):
+            if allowed_file(file.filename, {"zip"}):
+                total_size += validate_file(file, {"zip"}, MAX_SERIES_SIZE_MB)
+                file.save(os.path.join(folder, "series.zip"))
+            else:
+                total_size += validate_file(file, SLICE_EXTENSIONS)
+                # Prefix with the upload order so slices sort as they were sent
+                extension = file.filename.rsplit('.', 1)[1].lower()
+                file.save(os.path.join(folder, f"{index:05d}.{extension}"))
+            if total_size > MAX_SERIES_SIZE_MB * 1024 * 1024:
+                raise ValueError(f"Series size exceeds the maximum limit of {MAX_SERIES_SIZE_MB} MB.")
+        series_slice_names(folder)  # Validate zip contents before accepting the job
+    except Exception:
+        shutil.rmtree(folder, ignore_errors=True)
+        raise
+    return folder
+
+
+def series_slice_names(folder):
+    """Return the slice names of a staged series in sort order."""
+    zip_path = os.path.join(folder, "series.zip")
+    if os.path.exists(zip_path):
+        with zipfile.ZipFile(zip_path) as archive:
+            infos = [
+                info for info in archive.infolist()
+                if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+                and allowed_file(info.filename, SLICE_EXTENSIONS)
+            ]
+        # Check the uncompressed size so a small archive cannot expand without bound
+        if sum(info.file_size for info in infos) > MAX_SERIES_SIZE_MB * 1024 * 1024:
+            raise ValueError(f"Series size exceeds the maximum limit of {MAX_SERIES_SIZE_MB} MB.")
+        names = sorted(info.filename for info in infos)
+    else:
+        names = sorted(name for name in os.listdir(folder) if allowed_file(name, SLICE_EXTENSIONS))
+
+    if not names:
+        raise ValueError("The series contains no image slices.")
+    if len(names) > MAX_SERIES_SLICES:
+        raise ValueError(f"A series may contain at most {MAX_SERIES_SLICES} slices.")
+    return names
+
+
+def iter_series_slices(folder):
+    """
+    Yields the slices of a staged series as grayscale uint8 arrays, one at a time.
+    - Only the current slice's compressed bytes and decoded image are held in memory.
+    """
+    names = series_slice_names(folder)
+    zip_path = os.path.join(folder, "series.zip")
+    archive = zipfile.ZipFile(zip_path) if os.path.exists(zip_path) else None
+    try:
+        for name in names:
+            if archive is not None:
+                data = archive.read(name)
+            else:
+                with open(os.path.join(folder, name), "rb") as f:
+                    data = f.read()
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                raise ValueError(f"Error: Unable to decode slice {name}.")
+            yield image
+    finally:
+        if archive is not None:
+            archive.close()
 
 
 def save_file(file, folder):
@@ -32,16 +166,7 @@ def save_file(file, folder):
             print(f"Error creating directory {upload_folder}: {e}")
             raise
 
-    # Validate file extension
-    if not allowed_file(file.filename):
-        raise ValueError(f"Invalid file type. Allowed extensions are: {', '.join(ALLOWED_EXTENSIONS)}")
-
-    # Validate file size
-    file.seek(0, os.SEEK_END)  # Move to the end of the file to get its size
-    file_size_mb = file.tell() / (1024 * 1024)  # Size in MB
-    if file_size_mb > MAX_FILE_SIZE_MB:
-        raise ValueError(f"File size exceeds the maximum limit of {MAX_FILE_SIZE_MB} MB.")
-    file.seek(0)  # Reset file pointer for reading
+    validate_file(file)
 
     # Generate a unique filename
     filename = f"{uuid.uuid4().hex}_{file.filename}"
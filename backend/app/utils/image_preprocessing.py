@@ -0,0 +1,68 @@
+import numpy as np
+import cv2
+
+# Model input geometry (unet-camvid-onnx-0001)
+MODEL_INPUT_WIDTH = 480
+MODEL_INPUT_HEIGHT = 368
+MODEL_INPUT_SHAPE = (1, 3, MODEL_INPUT_HEIGHT, MODEL_INPUT_WIDTH)
+
+# Pixels darker than this are treated as background
+THRESHOLD = 10
+
+
+def allocate_input_buffer(batch_size=1, shape=MODEL_INPUT_SHAPE):
+    """Allocate a contiguous float32 NCHW buffer for the model input (`shape` is the 1-sample shape)."""
+    return np.empty((batch_size,) + tuple(shape[1:]), dtype=np.float32)
+
+
+def preprocess_into(image, out, scratch=None, inplace=False):
+    """
+    Preprocesses a grayscale uint8 image directly into a float32 NCHW buffer.
+    - `out` may be a preallocated array or an infer request's input tensor data.
+    - `scratch` is an optional (H, W) uint8 buffer reused for the resized image.
+    - With `inplace=True` the threshold overwrites `image` instead of a copy.
+    """
+    sample = out[0] if out.ndim == 4 else out
+    _, height, width = sample.shape
+
+    thresholded = image if inplace else np.empty_like(image)
+    cv2.threshold(image, THRESHOLD, 255, cv2.THRESH_BINARY, dst=thresholded)
+
+    if scratch is None:
+        scratch = np.empty((height, width), dtype=np.uint8)
+    cv2.resize(thresholded, (width, height), dst=scratch)
+
+    # Normalize into the first channel; gray to RGB is a copy into the other two
+    np.divide(scratch, 255.0, out=sample[0], dtype=np.float32, casting="unsafe")
+    np.copyto(sample[1], sample[0])
+    np.copyto(sample[2], sample[0])
+    return out
+
+
+class Preprocessor:
+    """Reusable preprocessing engine that owns its output and scratch buffers.
+
+    Not thread-safe: each worker thread should hold its own instance, or pass
+    the infer request's input tensor as `out` to skip the intermediate buffer.
+    """
+
+    def __init__(self, batch_size=1, shape=MODEL_INPUT_SHAPE):
+        self.buffer = allocate_input_buffer(batch_size, shape)
+        self.scratch = np.empty(tuple(shape[2:]), dtype=np.uint8)
+
+    def __call__(self, image, out=None, index=0, inplace=False):
+        """Preprocess `image` into sample `index` of `out` (defaults to the owned buffer)."""
+        target = self.buffer if out is None else out
+        preprocess_into(image, target[index], self.scratch, inplace=inplace)
+        return target
+
+
+def prepare_uint8_input(image):
+    """
+    Prepares a grayscale image for a model with embedded preprocessing.
+    - Only the threshold and gray-to-RGB expansion run on the host, in uint8.
+    - Resize, normalization and NHWC->NCHW conversion run inside the model.
+    """
+    _, thresholded = cv2.threshold(image, THRESHOLD, 255, cv2.THRESH_BINARY)
+    rgb_image = cv2.cvtColor(thresholded, cv2.COLOR_GRAY2RGB)
+    return rgb_image[np.newaxis]
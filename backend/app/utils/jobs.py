@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Constants
+PIPELINE_WORKERS = int(os.environ.get("PROSTHETIC_PIPELINE_WORKERS", 4))  # Jobs orchestrated at once
+MESH_WORKERS = int(os.environ.get("PROSTHETIC_MESH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+JOB_RETENTION_SECONDS = 3600  # Finished jobs are forgotten after this long
+JOB_FOLDER = os.environ.get("PROSTHETIC_JOB_FOLDER", os.path.join("cache", "jobs"))  # Shared by all server workers
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Job:
+    """State of one background pipeline run, safe to read from request threads."""
+
+    def __init__(self, store=None):
+        self.id = uuid.uuid4().hex
+        self.store = store
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.preview = None  # PNG of a quick low-resolution mask, when the pipeline makes one
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._cleanups = []
+
+    def update(self, stage, progress):
+        """Record the current pipeline stage and progress in [0, 1]."""
+        self.stage = stage
+        self.progress = progress
+        self.updated_at = time.time()
+        self.save()
+
+    def set_preview(self, png):
+        """Publish the PNG of a quick low-resolution mask."""
+        self.preview = png
+        if self.store is not None:
+            self.store.save_preview(self)
+        self.save()
+
+    def save(self):
+        """Write the job's record to its store, if it has one."""
+        if self.store is not None:
+            self.store.save(self)
+
+    def on_finish(self, func):
+        """Register `func()` to run when the job finishes, whether it succeeded or failed."""
+        self._cleanups.append(func)
+        return func
+
+    def run_cleanups(self):
+        """Run registered cleanup callbacks, newest first."""
+        while self._cleanups:
+            func = self._cleanups.pop()
+            try:
+                func()
+            except Exception as e:
+                print(f"Cleanup for job {self.id} failed: {e}")
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "result": self.result,
+            "has_preview": self.preview is not None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_record(cls, record, preview=None):
+        """Rebuild a read-only Job from a `to_dict` record, e.g. one written by another worker."""
+        job = cls()
+        job.id = record["job_id"]
+        for name in ("status", "stage", "progress", "result", "error", "created_at", "updated_at"):
+            setattr(job, name, record[name])
+        job.preview = preview
+        return job
+
+
+class JobStore:
+    """
+    Job records on local disk, so every server worker can report every job.
+    - Each job is `<job_id>.json` (its `to_dict` record) plus `<job_id>.png`
+      for its preview, written atomically so readers never see a partial file.
+    - Gunicorn workers share the folder, so a status poll may land on any worker.
+    """
+
+    def __init__(self, folder=JOB_FOLDER):
+        self.folder = folder
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _path(self, job_id, ext):
+        return os.path.join(self.folder, f"{job_id}{ext}")
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def save(self, job):
+        self._write(self._path(job.id, ".json"), json.dumps(job.to_dict()).encode())
+
+    def save_preview(self, job):
+        self._write(self._path(job.id, ".png"), job.preview)
+
+    def load(self, job_id):
+        """Return the stored job with `job_id`, or None if unknown, expired or not a job id."""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id, ".json")) as f:
+                record = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        preview = None
+        if record["has_preview"]:
+            with open(self._path(job_id, ".png"), "rb") as f:
+                preview = f.read()
+        return Job.from_record(record, preview)
+
+    def prune(self, cutoff, keep=()):
+        """Delete records not written since `cutoff` (a timestamp), except the job ids in `keep`."""
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name[:32] in keep:
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class JobManager:
+    """
+    Runs pipeline jobs in background threads and CPU-heavy stages in processes.
+    - Each job's pipeline function runs on a thread pool of `pipeline_workers`.
+    - `run_cpu` (or `submit_cpu`, for several tasks at once) offloads work to
+      a process pool of `mesh_workers`, which caps how many meshing stages
+      compete with inference for the CPU.
+    - Job state is written to a JobStore as it changes, so `get` finds jobs
+      run by other server workers too.
+    """
+
+    def __init__(self, pipeline_workers=PIPELINE_WORKERS, mesh_workers=MESH_WORKERS, store=None):
+        self.mesh_workers = mesh_workers
+        self.store = store
+        self._threads = ThreadPoolExecutor(max_workers=pipeline_workers, thread_name_prefix="job")
+        self._processes = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, pipeline, *args, **kwargs):
+        """Queue `pipeline(job, *args, **kwargs)` and return the new Job immediately."""
+        job = Job(self._store())
+        job.save()
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._threads.submit(self._run, job, pipeline, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """Return the job with `job_id`, or None if unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._store().load(job_id)
+
+    def _store(self):
+        """The JobStore, created on first use so importing this module writes nothing."""
+        with self._lock:
+            if self.store is None:
+                self.store = JobStore()
+            return self.store
+
+    def submit_cpu(self, func, *args, **kwargs):
+        """Queue `func` on the meshing process pool and return its Future."""
+        with self._lock:
+            if self._processes is None:
+                # Spawned workers avoid inheriting OpenVINO's runtime threads via fork
+                context = multiprocessing.get_context("spawn")
+                self._processes = ProcessPoolExecutor(max_workers=self.mesh_workers, mp_context=context)
+            processes = self._processes
+        return processes.submit(func, *args, **kwargs)
+
+    def run_cpu(self, func, *args, **kwargs):
+        """Run `func` in the meshing process pool and wait for its result."""
+        return self.submit_cpu(func, *args, **kwargs).result()
+
+    def _run(self, job, pipeline, args, kwargs):
+        job.status = "running"
+        job.save()
+        try:
+            job.result = pipeline(job, *args, **kwargs)
+            job.status = "done"
+            job.update("done", 1.0)
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+            job.update("failed", job.progress)
+        finally:
+            job.run_cleanups()
+
+    def _prune(self):
+        """Forget finished jobs older than the retention window (caller holds the lock)."""
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+        self.store.prune(cutoff, keep=self._jobs)
+
+    def shutdown(self):
+        self._threads.shutdown(wait=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
+
+
+# Shared by the prosthetic routes
+job_manager = JobManager()
@@ -0,0 +1,194 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import numpy as np
+
+# Constants
+CACHE_FOLDER = os.path.join("cache", "results")  # Compressed segmentation masks
+STL_FOLDER = os.path.join("backend", "app", "static", "prosthetics")  # Same folder as mesh_processing.STL_DIR
+MAX_CACHE_SIZE_MB = int(os.environ.get("PROSTHETIC_RESULT_CACHE_MB", 512))
+STL_PREFIX = "cached_"
+KEY_LENGTH = 64  # Hex digits of a sha256 key
+
+
+class ResultCache:
+    """
+    Content-addressed cache of segmentation masks and generated STL files.
+    - Keys hash the decoded image together with the model id (which
+      fingerprints the IR files, see InferenceServer.model_id), device and
+      mesh parameters.
+    - Masks are stored as compressed .npz files, the mesh outputs (STL and
+      viewer formats per level of detail, with compressed sidecars) next to
+      the other prosthetic outputs as `cached_<key>...`, and the pipeline's
+      result summary as a small .json file.
+    - Entries are evicted least-recently-used once the total size exceeds `max_size_mb`.
+    """
+
+    def __init__(self, folder=CACHE_FOLDER, stl_folder=STL_FOLDER, max_size_mb=MAX_CACHE_SIZE_MB):
+        self.folder = folder
+        self.stl_folder = stl_folder
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.folder, exist_ok=True)
+        os.makedirs(self.stl_folder, exist_ok=True)
+
+    @staticmethod
+    def make_key(image, model_id, device, mesh_params):
+        """Hash a decoded image and the parameters that determine its result."""
+        digest = hashlib.sha256()
+        digest.update(f"{image.shape}|{image.dtype}|{model_id}|{device}|".encode())
+        digest.update(json.dumps(mesh_params, sort_keys=True).encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _tmp_path(path):
+        """Temporary name for writing `path`, unique across processes (e.g. gunicorn workers) and threads."""
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _mask_path(self, key):
+        return os.path.join(self.folder, f"{key}.npz")
+
+    @staticmethod
+    def stl_id(key):
+        """Output id under which the cached STL for `key` is served."""
+        return f"{STL_PREFIX}{key}"
+
+    def _info_path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def _stl_path(self, key, suffix=".stl"):
+        return os.path.join(self.stl_folder, f"{self.stl_id(key)}{suffix}")
+
+    def _output_files(self):
+        """Map each key to the mesh output files stored under its id."""
+        outputs = {}
+        for name in os.listdir(self.stl_folder):
+            if name.startswith(STL_PREFIX) and not name.endswith(".tmp"):
+                key = name[len(STL_PREFIX):len(STL_PREFIX) + KEY_LENGTH]
+                outputs.setdefault(key, []).append(os.path.join(self.stl_folder, name))
+        return outputs
+
+    def _paths(self, key, outputs):
+        """Every file belonging to `key`, given the `_output_files` map."""
+        return [self._mask_path(key), self._info_path(key)] + outputs.get(key, [])
+
+    def get(self, key):
+        """Return the cached entry paths for `key`, or None on a miss."""
+        mask_path, stl_path = self._mask_path(key), self._stl_path(key)
+        with self._lock:
+            if not (os.path.exists(mask_path) and os.path.exists(stl_path)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Refresh the access time used for LRU eviction
+            for path in (mask_path, stl_path):
+                os.utime(path)
+        return {"mask_path": mask_path, "stl_path": stl_path, "stl_id": self.stl_id(key), "info": self._load_info(key)}
+
+    def _load_info(self, key):
+        try:
+            with open(self._info_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load_mask(self, key):
+        """Load the cached segmentation mask for `key`."""
+        with np.load(self._mask_path(key)) as data:
+            return data["mask"]
+
+    def put(self, key, segmentation_mask, stl_file_path, move=False, extra_file_paths=(), info=None):
+        """Store a mask and its STL under `key`, then evict if over budget.
+
+        `extra_file_paths` are the other outputs named after the STL, such as
+        `<id>_lod1.stl` or `<id>.glb.gz`; each is stored under the cached id
+        with the same suffix. `info` is a JSON-serializable summary returned
+        again on hits. With `move=True` files are renamed instead of copied.
+        """
+        mask_path, stl_path = self._mask_path(key), self._stl_path(key)
+
+        # Write to temporary names and rename so readers never see partial files
+        tmp_mask = self._tmp_path(mask_path)
+        with open(tmp_mask, "wb") as f:
+            np.savez_compressed(f, mask=segmentation_mask)
+        os.replace(tmp_mask, mask_path)
+
+        tmp_info = self._tmp_path(self._info_path(key))
+        with open(tmp_info, "w") as f:
+            json.dump(info or {}, f)
+        os.replace(tmp_info, self._info_path(key))
+
+        # Extra files first, so a visible full-detail STL implies the rest are in place
+        stem = stl_file_path[:-len(".stl")]
+        sources = []
+        for path in extra_file_paths:
+            if not path.startswith(stem):
+                raise ValueError(f"{path} is not named after {stl_file_path}")
+            sources.append((path, self._stl_path(key, path[len(stem):])))
+        for source, target in sources + [(stl_file_path, stl_path)]:
+            if move:
+                os.replace(source, target)
+            else:
+                tmp_stl = self._tmp_path(target)
+                shutil.copyfile(source, tmp_stl)
+                os.replace(tmp_stl, target)
+
+        with self._lock:
+            self._evict()
+        return {"mask_path": mask_path, "stl_path": stl_path, "stl_id": self.stl_id(key), "info": info or {}}
+
+    def _entries(self):
+        """Return (last_access, size_bytes, key) for every cached key."""
+        entries = []
+        outputs = self._output_files()
+        for name in os.listdir(self.folder):
+            if not name.endswith(".npz"):
+                continue
+            key = name[:-len(".npz")]
+            paths = [p for p in self._paths(key, outputs) if os.path.exists(p)]
+            try:
+                last_access = max(os.path.getmtime(p) for p in paths)
+                size = sum(os.path.getsize(p) for p in paths)
+            except (OSError, ValueError):
+                continue
+            entries.append((last_access, size, key))
+        return entries
+
+    def _evict(self):
+        """Remove least-recently-used entries until the cache fits its budget (caller holds the lock)."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        outputs = self._output_files() if total > self.max_size_bytes else {}
+        for _, size, key in entries:
+            if total <= self.max_size_bytes:
+                break
+            for path in self._paths(key, outputs):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            print(f"Evicted cached result {key}")
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size."""
+        with self._lock:
+            entries = self._entries()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(entries),
+                "size_mb": sum(size for _, size, _ in entries) / (1024 * 1024),
+                "max_size_mb": self.max_size_bytes / (1024 * 1024),
+            }
+
+
+# Shared by the prosthetic routes
+result_cache = ResultCache()
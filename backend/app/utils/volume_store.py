@@ -0,0 +1,128 @@
+import os
+import json
+import shutil
+import tempfile
+from collections import namedtuple
+import numpy as np
+
+# Constants
+VOLUME_FOLDER = os.environ.get("PROSTHETIC_VOLUME_FOLDER")  # None uses the system temp dir
+
+
+class VolumeRef(namedtuple("VolumeRef", ["folder", "name"])):
+    """
+    Picklable handle to a volume in a VolumeStore folder.
+    - Passing a VolumeRef to another process sends two strings, not the voxels;
+      the receiver reads the slices it needs from the same file with
+      `read_slices()`, or the whole volume with `open()`.
+    """
+
+    def open(self):
+        """Map the whole volume; bit-packed volumes are unpacked into memory."""
+        return VolumeStore(self.folder).open(self.name)
+
+    def read_slices(self, start, stop):
+        """Read slices [start, stop) as a uint8 array, unpacking only those slices."""
+        return VolumeStore(self.folder).read_slices(self.name, start, stop)
+
+    @property
+    def shape(self):
+        return tuple(VolumeStore(self.folder).metadata(self.name)["shape"])
+
+
+class VolumeStore:
+    """
+    Job-scoped store of memory-mapped volumes with compact dtypes.
+    - `create` returns a writable np.memmap; `open` maps it read-only (zero-copy).
+    - Binary masks can be bit-packed with `pack`, storing 8 voxels per byte.
+      A packed volume is no longer zero-copy: `open` unpacks all of it into
+      memory, so read it in slabs with `read_slices` instead.
+    - Use as a context manager (or call `cleanup`) to delete the files when done.
+    """
+
+    def __init__(self, folder=None):
+        self.folder = folder or tempfile.mkdtemp(prefix="volumes_", dir=VOLUME_FOLDER)
+        os.makedirs(self.folder, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def _data_path(self, name):
+        return os.path.join(self.folder, f"{name}.raw")
+
+    def _meta_path(self, name):
+        return os.path.join(self.folder, f"{name}.json")
+
+    def metadata(self, name):
+        """Return the stored shape, dtype and packing of volume `name`."""
+        with open(self._meta_path(name)) as f:
+            return json.load(f)
+
+    def _write_metadata(self, name, shape, dtype, packed=False):
+        with open(self._meta_path(name), "w") as f:
+            json.dump({"shape": list(shape), "dtype": np.dtype(dtype).str, "packed": packed}, f)
+
+    def ref(self, name):
+        """Return a picklable reference to volume `name`."""
+        return VolumeRef(self.folder, name)
+
+    def create(self, name, shape, dtype=np.uint8):
+        """Create a writable memory-mapped volume."""
+        self._write_metadata(name, shape, dtype)
+        return np.memmap(self._data_path(name), dtype=dtype, mode="w+", shape=tuple(shape))
+
+    def _open_raw(self, name, meta, mode="r"):
+        shape = tuple(meta["shape"])
+        if meta["packed"]:
+            shape = shape[:-1] + ((shape[-1] + 7) // 8,)
+        return np.memmap(self._data_path(name), dtype=np.dtype(meta["dtype"]), mode=mode, shape=shape)
+
+    def open(self, name, mode="r"):
+        """Map volume `name`; plain volumes are zero-copy, packed ones are unpacked into memory in full."""
+        meta = self.metadata(name)
+        data = self._open_raw(name, meta, mode)
+        if meta["packed"]:
+            return np.unpackbits(data, axis=-1, count=meta["shape"][-1])
+        return data
+
+    def read_slices(self, name, start, stop):
+        """Read slices [start, stop) along the first axis as a uint8 array, unpacking only those slices."""
+        meta = self.metadata(name)
+        data = self._open_raw(name, meta)[start:stop]
+        if meta["packed"]:
+            return np.unpackbits(data, axis=-1, count=meta["shape"][-1])
+        return data
+
+    def pack(self, name, chunk_slices=64):
+        """Bit-pack a 0/1 uint8 volume in place, slice chunk by slice chunk."""
+        meta = self.metadata(name)
+        if meta["packed"]:
+            return self.ref(name)
+        if np.dtype(meta["dtype"]) != np.uint8:
+            raise ValueError("Only uint8 0/1 masks can be bit-packed.")
+
+        source = self._open_raw(name, meta)
+        shape = tuple(meta["shape"])
+        packed_path = self._data_path(name) + ".packed"
+        packed = np.memmap(packed_path, dtype=np.uint8, mode="w+", shape=shape[:-1] + ((shape[-1] + 7) // 8,))
+        for start in range(0, shape[0], chunk_slices):
+            packed[start:start + chunk_slices] = np.packbits(source[start:start + chunk_slices], axis=-1)
+        packed.flush()
+        del source, packed
+
+        os.replace(packed_path, self._data_path(name))
+        self._write_metadata(name, shape, np.uint8, packed=True)
+        return self.ref(name)
+
+    def delete(self, name):
+        """Remove volume `name` and its metadata."""
+        for path in (self._data_path(name), self._meta_path(name)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def cleanup(self):
+        """Delete every volume in the store."""
+        shutil.rmtree(self.folder, ignore_errors=True)
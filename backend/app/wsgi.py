@@ -0,0 +1,11 @@
+# File: backend/app/wsgi.py
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app (run from backend/app)
+
+import os
+from app import app, start_warmup
+
+application = app
+
+# Pre-forking servers (see gunicorn.conf.py) defer this to each worker's post_fork
+if os.environ.get("PROSTHETIC_DEFER_WARMUP", "0") != "1":
+    start_warmup()
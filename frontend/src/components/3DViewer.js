@@ -2,15 +2,24 @@ import React, { useRef } from "react";
 import { Canvas } from "@react-three/fiber";
 import { OrbitControls, Stage, useGLTF } from "@react-three/drei";
 
-function STLViewer({ stlFileUrl }) {
+// Loads the compact GLB output (quantized or Draco-compressed) served by
+// /prosthetic/mesh/<id>.glb; `true` enables the Draco decoder.
+function Model({ modelUrl }) {
+  const { scene } = useGLTF(modelUrl, true);
+  return <primitive object={scene} />;
+}
+
+function STLViewer({ modelUrl, stlFileUrl }) {
   const mesh = useRef();
+  // Older callers pass the STL URL; the GLB is written next to it
+  const url = modelUrl || stlFileUrl.replace(/\.stl$/, ".glb");
 
   return (
     <Canvas>
       <OrbitControls />
       <Stage environment="city" intensity={0.6}>
         <mesh ref={mesh}>
-          <primitive object={useGLTF(stlFileUrl)} />
+          <Model modelUrl={url} />
         </mesh>
       </Stage>
     </Canvas>